@@ -0,0 +1,115 @@
+"""
+Concurrent throughput of the Gateway proxy: legacy blocking `requests` proxy
+vs. the pooled async proxy.
+
+Usage: python benchmark_proxy.py [--requests 200] [--concurrency 50] [--delay 0.05]
+"""
+import argparse
+import asyncio
+import threading
+import time
+
+import httpx
+import requests
+import uvicorn
+from fastapi import FastAPI, Request, Response
+
+import consul_client
+import proxy
+from ecolabel_common.service_discovery import ServiceInstance
+
+UPSTREAM_PORT = 18101
+LEGACY_PORT = 18102
+POOLED_PORT = 18103
+
+
+def build_upstream(delay: float) -> FastAPI:
+    upstream = FastAPI()
+
+    @upstream.api_route("/slow", methods=["GET", "POST"])
+    async def slow(request: Request):
+        body = await request.body()
+        await asyncio.sleep(delay)
+        return Response(content=body or b"ok")
+
+    return upstream
+
+
+def build_legacy_gateway() -> FastAPI:
+    gateway = FastAPI()
+
+    @gateway.api_route("/UPSTREAM/{path:path}", methods=["GET", "POST"])
+    async def legacy(path: str, request: Request):
+        # Same code path as the original proxy_request (blocking client, new connection each call)
+        body = await request.body()
+        response = requests.request(
+            method=request.method,
+            url=f"http://127.0.0.1:{UPSTREAM_PORT}/{path}",
+            headers=dict(request.headers),
+            params=dict(request.query_params),
+            data=body,
+            timeout=5
+        )
+        return Response(content=response.content, status_code=response.status_code)
+
+    return gateway
+
+
+def build_pooled_gateway() -> FastAPI:
+    gateway = FastAPI()
+    consul_client.registry.ttl = 3600
+    consul_client.registry.seed("UPSTREAM", [ServiceInstance("stub", "127.0.0.1", UPSTREAM_PORT)])
+
+    @gateway.api_route("/UPSTREAM/{path:path}", methods=["GET", "POST"])
+    async def pooled(path: str, request: Request):
+        return await proxy.proxy_request("UPSTREAM", path, request)
+
+    return gateway
+
+
+def serve(app: FastAPI, port: int):
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+
+async def run_load(url: str, total: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        async def one():
+            async with semaphore:
+                response = await client.post(url, content=b"x" * 1024)
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--delay", type=float, default=0.05, help="upstream latency in seconds")
+    args = parser.parse_args()
+
+    serve(build_upstream(args.delay), UPSTREAM_PORT)
+    serve(build_legacy_gateway(), LEGACY_PORT)
+    serve(build_pooled_gateway(), POOLED_PORT)
+
+    print(f"{args.requests} requests, concurrency {args.concurrency}, upstream delay {args.delay * 1000:.0f} ms")
+    targets = (
+        ("direct upstream", f"http://127.0.0.1:{UPSTREAM_PORT}/slow"),
+        ("legacy (requests)", f"http://127.0.0.1:{LEGACY_PORT}/UPSTREAM/slow"),
+        ("pooled (httpx)", f"http://127.0.0.1:{POOLED_PORT}/UPSTREAM/slow"),
+    )
+    for name, url in targets:
+        elapsed = asyncio.run(run_load(url, args.requests, args.concurrency))
+        print(f"{name:<20} {elapsed:7.2f} s  {args.requests / elapsed:8.1f} req/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,27 @@
+import os
+
 CONSUL_HOST = "consul"
 CONSUL_PORT = 8500
 
 TIMEOUT = 5
+
+# -------- Upstream connection pools -------- #
+# One pool per upstream service; limits apply to each pool independently.
+POOL_MAX_CONNECTIONS = int(os.getenv("POOL_MAX_CONNECTIONS", "100"))
+POOL_MAX_KEEPALIVE = int(os.getenv("POOL_MAX_KEEPALIVE", "20"))
+POOL_KEEPALIVE_EXPIRY = float(os.getenv("POOL_KEEPALIVE_EXPIRY", "30"))
+
+# -------- /analyze pipeline -------- #
+# Per-stage timeout: NLP inference and OCR are much slower than a proxied call
+PIPELINE_STAGE_TIMEOUT = float(os.getenv("PIPELINE_STAGE_TIMEOUT", "60"))
+
+# -------- Request coalescing -------- #
+# Request headers the upstream response can depend on: only requests with the
+# same values share a response (one user's authenticated response, or a
+# response in another language, is never served to another caller)
+COALESCE_KEY_HEADERS = ("authorization", "cookie", "accept", "accept-language")
+
+# GET requests are always coalesced; these POST routes are idempotent lookups
+COALESCED_POST_ROUTES = {
+    ("PARSER-PRODUIT", "product/parse"),
+}
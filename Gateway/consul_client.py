@@ -1,17 +1,26 @@
-import requests
+from starlette.concurrency import run_in_threadpool
+
 from config import CONSUL_HOST, CONSUL_PORT
+from ecolabel_common.service_discovery import ServiceRegistry, ServiceInstance
 
 CONSUL_BASE_URL = f"http://{CONSUL_HOST}:{CONSUL_PORT}"
 
+registry = ServiceRegistry(CONSUL_BASE_URL)
+
 def discover_service(service_name: str) -> str:
     """
-    Returns service base URL from Consul
+    Returns service base URL from the discovery cache
     """
-    url = f"{CONSUL_BASE_URL}/v1/catalog/service/{service_name}"
-    response = requests.get(url, timeout=5)
+    return registry.pick(service_name).url
 
-    if response.status_code != 200 or not response.json():
-        raise Exception(f"Service {service_name} not found in Consul")
+async def acquire_instance(service_name: str) -> ServiceInstance:
+    """
+    Picks an instance for a proxied call; release it with release_instance()
+    """
+    # Cache misses hit Consul synchronously: keep them off the event loop
+    if not registry.is_fresh(service_name):
+        await run_in_threadpool(registry.instances, service_name)
+    return registry.acquire(service_name)
 
-    service = response.json()[0]
-    return f"http://{service['ServiceAddress']}:{service['ServicePort']}"
+def release_instance(instance: ServiceInstance):
+    registry.release(instance)
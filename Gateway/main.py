@@ -1,7 +1,8 @@
 import socket
 
 from fastapi import FastAPI, Request
-from proxy import proxy_request
+from proxy import proxy_request, close_clients, coalescer
+from pipeline import AnalyzeRequest, run_analysis
 import requests
 
 
@@ -9,12 +10,15 @@ app = FastAPI(title="EcoLabel API Gateway")
 CONSUL_URL = "http://consul:8500/v1/agent/service/register"
 
 def register_service(name: str, service_name: str, port: int):
+    address = socket.gethostbyname(socket.gethostname())
+    # One ID per replica so scaled-out instances do not overwrite each other
     payload = {
+        "ID": f"{service_name}-{socket.gethostname()}",
         "Name": name,
-        "Address": socket.gethostbyname(socket.gethostname()),
+        "Address": address,
         "Port": port,
         "Check": {
-            "HTTP": f"http://{service_name}:{port}/health",
+            "HTTP": f"http://{address}:{port}/health",
             "Interval": "10s"
         }
     }
@@ -24,6 +28,10 @@ def register_service(name: str, service_name: str, port: int):
 def startup():
     register_service("GATEWAY", "gateway", 8080)
 
+@app.on_event("shutdown")
+async def shutdown():
+    await close_clients()
+
 # -------- ROUTES -------- #
 
 @app.api_route("/PARSER-PRODUIT/{path:path}", methods=["GET", "POST"])
@@ -42,6 +50,21 @@ async def lca_gateway(path: str, request: Request):
 async def scoring_gateway(path: str, request: Request):
     return await proxy_request("SCORING", path, request)
 
+# -------- PIPELINE -------- #
+
+@app.post("/analyze")
+async def analyze(request: AnalyzeRequest):
+    """
+    Full analysis in one round trip: ParserProduit -> NLP -> LCA -> Scoring
+    """
+    return await run_analysis(request)
+
+# -------- STATS -------- #
+
+@app.get("/stats")
+def stats():
+    return {"coalescing": coalescer.stats()}
+
 # -------- HEALTH -------- #
 
 @app.get("/health")
@@ -0,0 +1,109 @@
+import re
+import time
+from typing import Optional
+
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+from config import PIPELINE_STAGE_TIMEOUT
+from proxy import call_service
+
+
+class AnalyzeRequest(BaseModel):
+    barcode: Optional[str] = None
+    image_base64: Optional[str] = None
+    # Required for image-only analysis (same contract as /product/parse-from-image)
+    product_name: Optional[str] = None
+    product_weight_g: Optional[float] = None
+
+
+class StageTimer:
+    def __init__(self):
+        self.timings_ms = {}
+
+    async def run(self, stage: str, coro):
+        start = time.perf_counter()
+        try:
+            return await coro
+        finally:
+            self.timings_ms[stage] = round((time.perf_counter() - start) * 1000, 1)
+
+
+def build_nlp_text(product: dict) -> str:
+    """
+    Builds the NLP input the same way the mobile app does: "Name 250g. composition"
+    """
+    name = (product.get("name") or "").strip()
+    composition = (product.get("composition") or "").strip()
+    weight = product.get("netWeight_g")
+    weight_str = f"{weight:g}g." if isinstance(weight, (int, float)) else ""
+
+    text = " ".join(part for part in (name, weight_str, composition) if part)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+async def run_analysis(request: AnalyzeRequest) -> dict:
+    if not request.barcode and not request.image_base64:
+        raise HTTPException(status_code=400, detail="barcode ou image_base64 requis")
+
+    timer = StageTimer()
+    total_start = time.perf_counter()
+
+    # STEP 1 — Product data (barcode lookup, or OCR on the image)
+    if request.barcode:
+        parse_payload = {"barcode": request.barcode}
+        if request.image_base64:
+            parse_payload["image_base64"] = request.image_base64
+        parsed = await timer.run("parse", call_service(
+            "PARSER-PRODUIT", "product/parse", parse_payload, PIPELINE_STAGE_TIMEOUT
+        ))
+    else:
+        parsed = await timer.run("parse", call_service(
+            "PARSER-PRODUIT", "product/parse-from-image",
+            {
+                "image_base64": request.image_base64,
+                "product_name": request.product_name,
+                "product_weight_g": request.product_weight_g,
+            },
+            PIPELINE_STAGE_TIMEOUT,
+        ))
+    product = parsed.get("product_data", {})
+
+    text = build_nlp_text(product)
+    if not text:
+        raise HTTPException(status_code=422, detail="Aucun texte exploitable pour l'analyse NLP")
+
+    # STEP 2 — NLP extraction
+    extraction = await timer.run("nlp", call_service(
+        "NLP-INGREDIENTS", "extract", {"text": text}, PIPELINE_STAGE_TIMEOUT
+    ))
+
+    # STEP 3 — LCA (fall back to parser data when the model misses a field)
+    weight = extraction.get("weight")
+    if not weight and product.get("netWeight_g"):
+        weight = f"{product['netWeight_g']:g}g"
+    lca = await timer.run("lca", call_service(
+        "LCA-LITE", "lca/calc",
+        {
+            "product_name": extraction.get("product_name") or product.get("name") or "",
+            "weight": weight or "",
+            "ingredients": extraction.get("ingredients", []),
+        },
+        PIPELINE_STAGE_TIMEOUT,
+    ))
+
+    # STEP 4 — Scoring
+    score = await timer.run("scoring", call_service(
+        "SCORING", "score/compute", lca, PIPELINE_STAGE_TIMEOUT
+    ))
+
+    timer.timings_ms["total"] = round((time.perf_counter() - total_start) * 1000, 1)
+    return {
+        "gtin": parsed.get("gtin"),
+        "source": parsed.get("source"),
+        "product": product,
+        "extraction": extraction,
+        "lca": lca,
+        "score": score,
+        "timings_ms": timer.timings_ms,
+    }
@@ -1,22 +1,170 @@
-import requests
-from fastapi import Request, Response
-from consul_client import discover_service
+import hashlib
 
-async def proxy_request(service_name: str, path: str, request: Request):
-    base_url = discover_service(service_name)
-    target_url = f"{base_url}/{path}"
+import httpx
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+
+from config import (
+    TIMEOUT,
+    POOL_MAX_CONNECTIONS,
+    POOL_MAX_KEEPALIVE,
+    POOL_KEEPALIVE_EXPIRY,
+    COALESCED_POST_ROUTES,
+    COALESCE_KEY_HEADERS,
+)
+from consul_client import acquire_instance, release_instance
+from ecolabel_common.singleflight import SingleFlight
+
+# Headers that only make sense for a single hop and must not be forwarded
+HOP_BY_HOP_HEADERS = {
+    "connection",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "te",
+    "trailers",
+    "transfer-encoding",
+    "upgrade",
+    "host",
+    "content-length",
+}
+
+_clients: dict[str, httpx.AsyncClient] = {}
+
+coalescer = SingleFlight()
+
+
+def get_client(service_name: str) -> httpx.AsyncClient:
+    """
+    Returns the shared keep-alive client (and connection pool) for an upstream
+    """
+    client = _clients.get(service_name)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=POOL_MAX_KEEPALIVE,
+                keepalive_expiry=POOL_KEEPALIVE_EXPIRY,
+            ),
+        )
+        _clients[service_name] = client
+    return client
+
+
+async def close_clients():
+    for client in _clients.values():
+        await client.aclose()
+    _clients.clear()
+
+
+def _filter_headers(headers) -> dict:
+    return {k: v for k, v in headers.items() if k.lower() not in HOP_BY_HOP_HEADERS}
+
+
+async def _finish(response: httpx.Response, instance):
+    await response.aclose()
+    release_instance(instance)
+
+
+def _vary_hash(request: Request, body: bytes) -> str:
+    """Hash of the body and of the request headers the response may vary on"""
+    digest = hashlib.sha256(body)
+    for name in COALESCE_KEY_HEADERS:
+        for value in request.headers.getlist(name):
+            digest.update(f"\n{name}:{value}".encode())
+    return digest.hexdigest()
+
+
+def _is_coalesced(service_name: str, path: str, method: str) -> bool:
+    return method == "GET" or (method == "POST" and (service_name, path.strip("/")) in COALESCED_POST_ROUTES)
+
+
+async def _send_buffered(service_name: str, path: str, method: str, headers: dict, params, body: bytes):
+    instance = await acquire_instance(service_name)
+    try:
+        response = await get_client(service_name).request(
+            method, f"{instance.url}/{path}", headers=headers, params=params, content=body
+        )
+    finally:
+        release_instance(instance)
+    # response.content is already decoded, so the encoding header no longer applies
+    headers = {k: v for k, v in _filter_headers(response.headers).items() if k.lower() != "content-encoding"}
+    return response.status_code, headers, response.content
+
+
+async def _coalesced_request(service_name: str, path: str, request: Request):
+    # Shared responses must be buffered: one upstream stream cannot feed several clients
     body = await request.body()
-    response = requests.request(
+    key = (
+        service_name,
+        request.method,
+        path,
+        str(request.query_params),
+        _vary_hash(request, body),
+    )
+    status_code, headers, content = await coalescer.do(key, lambda: _send_buffered(
+        service_name, path, request.method, _filter_headers(request.headers), request.query_params, body
+    ))
+    return Response(content=content, status_code=status_code, headers=headers)
+
+
+async def proxy_request(service_name: str, path: str, request: Request):
+    if _is_coalesced(service_name, path, request.method):
+        return await _coalesced_request(service_name, path, request)
+
+    instance = await acquire_instance(service_name)
+    target_url = f"{instance.url}/{path}"
+    client = get_client(service_name)
+
+    # Request and response bodies are streamed chunk by chunk, never buffered whole
+    upstream_request = client.build_request(
         method=request.method,
         url=target_url,
-        headers=dict(request.headers),
-        params=dict(request.query_params),
-        data=body,
-        timeout=5
+        headers=_filter_headers(request.headers),
+        params=request.query_params,
+        content=request.stream(),
     )
+    try:
+        response = await client.send(upstream_request, stream=True)
+    except Exception:
+        release_instance(instance)
+        raise
 
-    return Response(
-        content=response.content,
+    return StreamingResponse(
+        response.aiter_raw(),
         status_code=response.status_code,
-        headers=response.headers
+        headers=_filter_headers(response.headers),
+        background=BackgroundTask(_finish, response, instance),
     )
+
+
+async def call_service(service_name: str, path: str, payload: dict, timeout: float = TIMEOUT) -> dict:
+    """
+    POSTs JSON to an upstream over its pooled client and returns the decoded JSON body
+    """
+    instance = None
+    try:
+        instance = await acquire_instance(service_name)
+        response = await get_client(service_name).post(
+            f"{instance.url}/{path}", json=payload, timeout=timeout
+        )
+    except RuntimeError as e:
+        # Not registered in Consul, or no passing instance
+        raise HTTPException(status_code=503, detail=f"{service_name}: {e}")
+    except httpx.TimeoutException:
+        raise HTTPException(status_code=504, detail=f"{service_name}: timeout")
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"{service_name}: {e}")
+    finally:
+        if instance is not None:
+            release_instance(instance)
+
+    if response.status_code >= 400:
+        try:
+            detail = response.json().get("detail", response.text)
+        except ValueError:
+            detail = response.text
+        raise HTTPException(status_code=response.status_code, detail=f"{service_name}: {detail}")
+    return response.json()
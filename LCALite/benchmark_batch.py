@@ -0,0 +1,76 @@
+"""
+/lca/calc/batch arithmetic on synthetic catalogue products: one
+calculate_product call per product (what a recompute job did through
+/lca/calc) versus a single calculate_batch call over the sparse product x
+factor mass matrix. Both results are compared product by product.
+
+Usage: python benchmark_batch.py [--products 10000] [--max-ingredients 25]
+"""
+import argparse
+import random
+import time
+
+from benchmark_factor_lookup import load_rows
+from calculation import calculate_batch, calculate_product
+from factor_table import FactorTable
+
+
+def synthetic_products(rng: random.Random, names, count: int, max_ingredients: int):
+    products = []
+    for _ in range(count):
+        ingredients = [
+            rng.choice(names) if rng.random() < 0.8 else f"unknown ingredient {rng.randrange(1000)}"
+            for _ in range(rng.randint(1, max_ingredients))
+        ]
+        weight = rng.choice(["100g", "250g", "400 g", "1kg", "750ml", "4x125g", ""])
+        products.append((weight, ingredients))
+    return products
+
+
+def close(a: float, b: float) -> bool:
+    return abs(a - b) <= 1e-9 * max(1.0, abs(a), abs(b))
+
+
+def same(single, batched) -> bool:
+    (totals_a, breakdown_a), (totals_b, breakdown_b) = single, batched
+    # Totals are summed in a different order: the third decimal may round the other way
+    if any(abs(totals_a[k] - totals_b[k]) > 0.0011 for k in totals_a) or len(breakdown_a) != len(breakdown_b):
+        return False
+    for a, b in zip(breakdown_a, breakdown_b):
+        if a["ingredient"] != b["ingredient"] or a["missing_factor"] != b["missing_factor"]:
+            return False
+        if not all(close(a[k], b[k]) for k in ("mass_g", "co2_g", "water_L", "energy_MJ")):
+            return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--max-ingredients", type=int, default=25)
+    args = parser.parse_args()
+
+    rows = load_rows()
+    factors = FactorTable.from_rows(rows)
+    names = [ingredient_id.split(":", 1)[1].replace("_", " ") for ingredient_id, *_ in rows]
+    products = synthetic_products(random.Random(0), names, args.products, args.max_ingredients)
+    entries = sum(len(set(ingredients)) for _, ingredients in products)
+
+    start = time.perf_counter()
+    single = [calculate_product(factors, weight, ingredients) for weight, ingredients in products]
+    single_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batched = calculate_batch(factors, products)
+    batch_s = time.perf_counter() - start
+
+    mismatches = sum(not same(a, b) for a, b in zip(single, batched))
+    print(f"{len(products)} products, {entries} product x ingredient entries, {len(factors)} factors")
+    print(f"per product   {single_s * 1000:8.1f}ms  ({single_s / len(products) * 1e6:.1f} µs/product)")
+    print(f"batch         {batch_s * 1000:8.1f}ms  ({batch_s / len(products) * 1e6:.1f} µs/product)")
+    print(f"speedup       {single_s / batch_s:8.1f}x")
+    print(f"mismatches    {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Ingredient matching latency and accuracy.
+
+Queries are Agribalyse names degraded the way NLP output differs from them
+(lower case, no accents, plural/singular, qualifiers after the first comma
+dropped, one typo), so the expected factor of each query is known. Every
+lookup bypasses the memoization cache. A naive scan (difflib ratio against
+every indexed name) is timed on a sample for comparison.
+
+Usage: python benchmark_matcher.py [--queries 2000] [--naive 50]
+"""
+import argparse
+import difflib
+import random
+import statistics
+import time
+
+from benchmark_factor_lookup import ARTIFACT_PATH
+from factor_artifact import FactorArtifact
+from ingredient_matcher import IngredientMatcher, fold
+
+
+def degrade(rng: random.Random, name: str) -> str:
+    name = name.split(",")[0] if rng.random() < 0.5 else name.replace(",", "")
+    name = name.lower()
+    if rng.random() < 0.5:
+        name = fold(name)
+    words = name.split()
+    if words and rng.random() < 0.5:
+        i = rng.randrange(len(words))
+        words[i] = words[i] + "s" if not words[i].endswith("s") else words[i][:-1]
+    name = " ".join(words)
+    if len(name) > 6 and rng.random() < 0.3:
+        i = rng.randrange(1, len(name) - 1)
+        name = name[:i] + name[i + 1:]
+    return name
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return statistics.median(samples) * 1e6, samples[int(len(samples) * 0.95) - 1] * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--naive", type=int, default=20, help="queries timed with the naive scan")
+    args = parser.parse_args()
+
+    artifact = FactorArtifact.load(ARTIFACT_PATH)
+    known_ids = set(artifact.factor_ids.tolist())
+    start = time.perf_counter()
+    matcher = IngredientMatcher.from_artifact(artifact, known_ids=known_ids)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    rows = [row for row in artifact.names() if row[0] in known_ids]
+    rng = random.Random(0)
+    queries = []
+    for _ in range(args.queries):
+        ingredient_id, name_fr, name_en = rng.choice(rows)
+        name = name_fr if rng.random() < 0.7 else name_en
+        queries.append((degrade(rng, name), ingredient_id))
+
+    samples, top1, top5, matched = [], 0, 0, 0
+    for query, expected in queries:
+        start = time.perf_counter()
+        candidates = matcher.search(query, k=5)
+        samples.append(time.perf_counter() - start)
+        ids = [candidate for candidate, _, _ in candidates]
+        top1 += bool(ids) and ids[0] == expected
+        top5 += expected in ids
+        matched += bool(candidates) and candidates[0][2] >= matcher.min_score
+
+    naive = []
+    for query, _ in queries[:args.naive]:
+        start = time.perf_counter()
+        folded = fold(query)
+        max(range(len(matcher.names)), key=lambda i: difflib.SequenceMatcher(None, folded, matcher.names[i]).ratio())
+        naive.append(time.perf_counter() - start)
+
+    p50, p95 = percentiles(samples)
+    naive_p50, naive_p95 = percentiles(naive)
+    print(f"index: {len(matcher.names)} names, {len(matcher.postings)} trigrams, built in {build_ms:.0f}ms")
+    print(f"{len(queries)} degraded queries")
+    print(f"trigram index   p50 {p50:8.1f} µs   p95 {p95:8.1f} µs")
+    print(f"naive scan      p50 {naive_p50:8.1f} µs   p95 {naive_p95:8.1f} µs   ({len(naive)} queries)")
+    print(f"top-1 {top1 / len(queries):.3f}   top-5 {top5 / len(queries):.3f}   "
+          f"above min score ({matcher.min_score}) {matched / len(queries):.3f}")
+    print("top-1 counts a different id with the same name (e.g. cooked vs raw variants) as a miss")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+LCA arithmetic shared by /lca/calc and /lca/calc/batch: weight parsing, the
+split of the product weight over its ingredients, and the impacts.
+"""
+import re
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from factor_table import FactorTable, normalize_to_db
+from ingredient_matcher import IngredientMatcher
+
+WEIGHT_PATTERN = re.compile(r"(\d+)")
+DEFAULT_WEIGHT_G = 100
+
+
+def parse_weight_g(weight: str) -> int:
+    match = WEIGHT_PATTERN.match(weight.lower().strip())
+    return int(match.group(1)) if match else DEFAULT_WEIGHT_G
+
+
+# -------- Weight distribution --------
+def estimate_ingredients_weight(total_weight_g, ingredients):
+    n = len(ingredients)
+    if n == 0:
+        return {}
+
+    raw_weights = [n - i for i in range(n)]
+    total_raw = sum(raw_weights)
+
+    return {
+        ing: round((w / total_raw) * total_weight_g, 2)
+        for ing, w in zip(ingredients, raw_weights)
+    }
+
+
+def round_masses(masses_g: np.ndarray) -> np.ndarray:
+    """round(mass, 2) for a whole array: np.round can differ from round() near ties, those are redone one by one"""
+    rounded = np.round(masses_g, 2)
+    scaled = masses_g * 100
+    ties = np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6)
+    rounded[ties] = [round(mass, 2) for mass in masses_g[ties].tolist()]
+    return rounded
+
+
+def resolve(factors: FactorTable, matcher: Optional[IngredientMatcher], name: str) -> Tuple[int, Optional[str], float]:
+    """(factor column, matched ingredient_id, score): the exact canonical id first, then the fuzzy matcher"""
+    ingredient_id = normalize_to_db(name)
+    column = factors.index.get(ingredient_id)
+    if column is not None:
+        return column, ingredient_id, 1.0
+    if matcher is None:
+        return factors.missing, None, 0.0
+    ingredient_id, score = matcher.match(name)
+    if ingredient_id is None or ingredient_id not in factors.index:
+        return factors.missing, None, score
+    return factors.index[ingredient_id], ingredient_id, score
+
+
+def build_breakdown(names, masses_g, co2, water, energy, missing, factor_ids, scores) -> List[dict]:
+    return [
+        {
+            "ingredient": name,
+            "mass_g": mass_g,
+            "co2_g": c * 1000,
+            "water_L": w,
+            "energy_MJ": e,
+            "missing_factor": m,
+            "factor_id": factor_id,
+            "match_score": score
+        }
+        for name, mass_g, c, w, e, m, factor_id, score in zip(
+            names, masses_g, co2, water, energy, missing, factor_ids, scores
+        )
+    ]
+
+
+def build_totals(co2_kg: float, water_L: float, energy_MJ: float) -> dict:
+    return {
+        "co2_g": round(co2_kg * 1000, 3),
+        "water_L": round(water_L, 3),
+        "energy_MJ": round(energy_MJ, 3),
+    }
+
+
+def calculate_product(
+    factors: FactorTable, weight: str, ingredients: List[str], matcher: Optional[IngredientMatcher] = None
+) -> Tuple[dict, List[dict]]:
+    """(total impacts, per-ingredient breakdown) of one product"""
+    ingredient_masses = estimate_ingredients_weight(parse_weight_g(weight), ingredients)
+
+    # Unmatched ingredients count as zero
+    names = list(ingredient_masses)
+    masses_g = list(ingredient_masses.values())
+    columns, factor_ids, scores = zip(*[resolve(factors, matcher, name) for name in names]) if names else ((), (), ())
+    (co2, water, energy), missing = factors.impacts(
+        np.array(columns, dtype=np.intp),
+        [mass_g / 1000.0 for mass_g in masses_g]
+    )
+    breakdown = build_breakdown(
+        names, masses_g, co2.tolist(), water.tolist(), energy.tolist(), missing.tolist(), factor_ids, scores
+    )
+    return build_totals(float(co2.sum()), float(water.sum()), float(energy.sum())), breakdown
+
+
+def calculate_batch(
+    factors: FactorTable, products: Sequence[Tuple[str, List[str]]], matcher: Optional[IngredientMatcher] = None
+) -> List[Tuple[dict, List[dict]]]:
+    """
+    Same results as calculate_product for many (weight, ingredients) products.
+
+    Every (product, ingredient, mass) entry of the batch goes into one sparse
+    product x factor mass matrix (COO triplets); the masses and the totals of
+    all products are then computed with array operations over the whole batch
+    (see FactorTable.product_totals) instead of product by product.
+    """
+    rows, names, columns, factor_ids, scores, ranks, counts = [], [], [], [], [], [], []
+    # Catalogue products share most ingredient names: each is resolved once per batch
+    resolved = {}
+    for row, (_, ingredients) in enumerate(products):
+        # A repeated ingredient keeps its first position but the share of its
+        # last occurrence, like the dict built by estimate_ingredients_weight
+        positions = {ing: i for i, ing in enumerate(ingredients)}
+        n = len(ingredients)
+        for ing, i in positions.items():
+            match = resolved.get(ing)
+            if match is None:
+                match = resolved[ing] = resolve(factors, matcher, ing)
+            columns.append(match[0])
+            factor_ids.append(match[1])
+            scores.append(match[2])
+            ranks.append(n - i)
+        names.extend(positions)
+        rows.extend([row] * len(positions))
+        counts.extend([n] * len(positions))
+
+    rows = np.array(rows, dtype=np.intp)
+    ranks = np.array(ranks, dtype=np.float64)
+    counts = np.array(counts, dtype=np.float64)
+    weights_g = np.array([parse_weight_g(weight) for weight, _ in products], dtype=np.float64)
+
+    # Share n - i out of n(n + 1)/2 of the product weight, as in estimate_ingredients_weight
+    masses_g = round_masses(ranks / (counts * (counts + 1) / 2) * weights_g[rows])
+    totals, impacts, missing = factors.product_totals(
+        rows, np.array(columns, dtype=np.intp), masses_g / 1000.0, len(products)
+    )
+    # bincount returns integer zeros when the batch has no ingredient at all:
+    # totals must stay floats, as calculate_product returns them
+    totals = totals.astype(np.float64, copy=False)
+
+    masses_g, missing = masses_g.tolist(), missing.tolist()
+    co2, water, energy = impacts.tolist()
+    bounds = np.searchsorted(rows, np.arange(len(products) + 1)).tolist()
+    results = []
+    for row, (start, end) in enumerate(zip(bounds, bounds[1:])):
+        breakdown = build_breakdown(
+            names[start:end], masses_g[start:end], co2[start:end],
+            water[start:end], energy[start:end], missing[start:end],
+            factor_ids[start:end], scores[start:end]
+        )
+        results.append((build_totals(*totals[:, row].tolist()), breakdown))
+    return results
@@ -0,0 +1,42 @@
+"""
+Expected matches of the ingredient matcher on a small labelled set: one JSON
+object per line with an ingredient name and the ingredient_id it must resolve
+to, or null when it must be reported as missing_factor. Catches changes to the
+tie-break, the aliases or the scoring that move common names to another
+Agribalyse variant ("pomme" to dried apple). Exits with status 1 on a mismatch.
+
+Usage: python check_matcher_expectations.py [--cases fixtures/matcher_expected.jsonl]
+"""
+import argparse
+import json
+import os
+import sys
+
+from factor_artifact import ARTIFACT_PATH, FactorArtifact
+from ingredient_matcher import ALIASES_PATH, IngredientMatcher
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cases", default=os.path.join(os.path.dirname(__file__), "fixtures", "matcher_expected.jsonl"))
+    args = parser.parse_args()
+
+    with open(args.cases, encoding="utf-8") as f:
+        cases = [json.loads(line) for line in f if line.strip()]
+
+    artifact = FactorArtifact.load(ARTIFACT_PATH)
+    matcher = IngredientMatcher.from_artifact(artifact, ALIASES_PATH, set(artifact.factor_ids.tolist()))
+
+    mismatches = 0
+    for case in cases:
+        ingredient_id, score, kind = matcher._match(case["name"])
+        if ingredient_id != case["expected"]:
+            mismatches += 1
+            print(f"MISMATCH {case['name']!r}: expected {case['expected']}, got {ingredient_id} ({kind}, {score})")
+
+    print(f"{len(cases)} names, {mismatches} mismatches")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Connection pool instrumentation for the LCALite engine.
+
+TimedQueuePool times every checkout from the moment a connection is requested
+until the pool hands one over (waiting for a free connection, or opening a new
+one within the overflow); the pool events count checkouts, checkins, new
+connections and invalidations. PoolMetrics.stats() backs /debug/pool.
+"""
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+
+# Recent checkout waits kept for the percentiles
+WAIT_SAMPLES = 2048
+
+
+class PoolMetrics:
+    def __init__(self, samples: int = WAIT_SAMPLES):
+        self.counters = {"checkouts": 0, "checkins": 0, "connects": 0, "invalidated": 0, "timeouts": 0}
+        self.wait_count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.waits = deque(maxlen=samples)
+        self._lock = threading.Lock()
+
+    def count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def record_wait(self, seconds: float):
+        with self._lock:
+            self.wait_count += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            self.waits.append(seconds)
+
+    def attach(self, engine):
+        @event.listens_for(engine, "checkout")
+        def on_checkout(dbapi_connection, connection_record, connection_proxy):
+            self.count("checkouts")
+
+        @event.listens_for(engine, "checkin")
+        def on_checkin(dbapi_connection, connection_record):
+            self.count("checkins")
+
+        @event.listens_for(engine, "connect")
+        def on_connect(dbapi_connection, connection_record):
+            self.count("connects")
+
+        @event.listens_for(engine, "invalidate")
+        def on_invalidate(dbapi_connection, connection_record, exception):
+            self.count("invalidated")
+
+    def stats(self, pool=None) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+            waits = sorted(self.waits)
+            wait_count, wait_total, wait_max = self.wait_count, self.wait_total, self.wait_max
+        timed = len(waits)
+        result = {
+            **counters,
+            "wait_ms": {
+                "avg": round(wait_total / wait_count * 1000, 3) if wait_count else 0.0,
+                "p50": round(waits[timed // 2] * 1000, 3) if timed else 0.0,
+                "p95": round(waits[int(timed * 0.95) - 1] * 1000, 3) if timed >= 20 else None,
+                "max": round(wait_max * 1000, 3),
+            },
+        }
+        if isinstance(pool, QueuePool):
+            result["pool"] = {
+                "size": pool.size(),
+                "checked_in": pool.checkedin(),
+                "checked_out": pool.checkedout(),
+                "overflow": pool.overflow(),
+                "max_overflow": pool._max_overflow,
+                "timeout_s": pool.timeout(),
+            }
+        return result
+
+
+metrics = PoolMetrics()
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that reports how long each checkout waited to `metrics`"""
+
+    _local = threading.local()
+
+    def _do_get(self):
+        # QueuePool._do_get retries by calling itself: only the outer call is timed
+        if getattr(self._local, "timing", False):
+            return super()._do_get()
+        self._local.timing = True
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            metrics.count("timeouts")
+            raise
+        finally:
+            self._local.timing = False
+            metrics.record_wait(time.perf_counter() - start)
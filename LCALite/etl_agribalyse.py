@@ -0,0 +1,161 @@
+"""
+Agribalyse 3.1 -> LCA factors artifact (Csv files/lca_factors.npz).
+
+Single replacement for Extract_lca_french_english_co2_water_energy.py,
+extract_lca_with_canonical_ids.py and import.py, with the same rules:
+- co2_per_kg: sum of the "Changement climatique" columns of the per-stage
+  detail file, water_L_per_kg: sum of its "Épuisement des ressources eau"
+  columns (non-numeric cells count as 0);
+- energy_MJ_per_kg: "Épuisement des ressources énergétiques" of the synthesis
+  file, joined on Code AGB;
+- products with an already seen French name are dropped;
+- ingredient_id is the canonical form of the English name, and the factors
+  keep the first product of each ingredient_id.
+
+Both CSVs are read once with the csv module, keeping only the needed columns
+as typed numpy arrays; canonical ids are computed over the whole name column
+at once. The SHA-256 of the inputs is stored in the artifact, and a run whose
+inputs (and ETL_VERSION) are unchanged does nothing.
+
+Usage: python etl_agribalyse.py [--out "Csv files/lca_factors.npz"] [--force]
+"""
+import argparse
+import csv
+import re
+import time
+import unicodedata
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from factor_artifact import ARTIFACT_PATH, FactorArtifact, file_sha256
+
+DETAIL_PATH = Path("Csv files/agribalyse-31-detail-par-etape.csv")
+SYNTHESE_PATH = Path("Csv files/agribalyse-31-synthese.csv")
+# Bump when the rules above change, so unchanged inputs are processed again
+ETL_VERSION = "1"
+
+CODE_COL = "Code AGB"
+NAME_FR_COL = "Nom du Produit en Français"
+NAME_EN_COL = "LCI Name"
+ENERGY_COL = "Épuisement des ressources énergétiques"
+
+# unidecode spellings of the non-accent characters found in the names;
+# every other non-ASCII character is decomposed or dropped
+TRANSLITERATION = str.maketrans({"œ": "oe", "æ": "ae", "ß": "ss", "ø": "o", "°": "deg", "…": "..."})
+
+
+def read_columns(path: Path, delimiter: str, wanted: Callable[[str], bool]) -> Dict[str, List[str]]:
+    """The columns whose header satisfies `wanted`, as lists of raw cells"""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f, delimiter=delimiter)
+        header = next(reader)
+        keep = [i for i, name in enumerate(header) if wanted(name)]
+        cells = [[row[i] for i in keep] for row in reader if row]
+    columns = list(zip(*cells)) if cells else [()] * len(keep)
+    return {header[i]: list(column) for i, column in zip(keep, columns)}
+
+
+def to_float(cells: List[str]) -> np.ndarray:
+    """pd.to_numeric(errors="coerce").fillna(0): invalid or empty cells become 0"""
+    def parse(cell):
+        try:
+            return float(cell)
+        except ValueError:
+            return 0.0
+
+    try:
+        values = np.array(cells, dtype=np.float64)
+    except ValueError:
+        values = np.array([parse(cell) for cell in cells], dtype=np.float64)
+    return np.nan_to_num(values, nan=0.0)
+
+
+def sum_columns(columns: Dict[str, List[str]], marker: str) -> np.ndarray:
+    matching = [to_float(cells) for name, cells in columns.items() if marker in name]
+    return np.sum(matching, axis=0)
+
+
+def canonical_ids(names: np.ndarray) -> np.ndarray:
+    """
+    ingredient:<english name, lower case, ASCII, without (...), letters and underscores only>,
+    the extract_lca_with_canonical_ids.py rule, applied to the whole column joined
+    into one string so each step is a single pass.
+    """
+    text = "\n".join(name.replace("\n", " ") for name in names.tolist()).lower().translate(TRANSLITERATION)
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+    text = re.sub(r"\(.*?\)", "", text)
+    text = re.sub(r"[^a-z \n]", "", text)
+    text = re.sub(r" +", " ", text)
+    text = re.sub(r"^ | $", "", text, flags=re.MULTILINE)
+    return np.array(["ingredient:" + name.replace(" ", "_") for name in text.split("\n")])
+
+
+def first_occurrences(keys: np.ndarray) -> np.ndarray:
+    """Positions of the first row of each distinct key, in input order (drop_duplicates(keep="first"))"""
+    _, first = np.unique(keys, return_index=True)
+    return np.sort(first)
+
+
+def build(detail_path: Path, synthese_path: Path) -> FactorArtifact:
+    detail = read_columns(
+        detail_path, ",",
+        lambda name: name in (CODE_COL, NAME_FR_COL, NAME_EN_COL)
+        or "Changement climatique" in name or "Épuisement des ressources eau" in name
+    )
+    synthese = read_columns(synthese_path, ";", lambda name: name in (CODE_COL, ENERGY_COL))
+
+    codes = np.array(detail[CODE_COL])
+    names_fr = np.array(detail[NAME_FR_COL])
+    names_en = np.array(detail[NAME_EN_COL])
+    # As in the historical factors, every column naming the impact is summed
+    # (per-stage totals and their biogenic/fossil/land-use parts alike)
+    co2 = sum_columns(detail, "Changement climatique")
+    water = sum_columns(detail, "Épuisement des ressources eau")
+
+    # Left join on Code AGB: products missing from the synthesis get 0 energy
+    synthese_codes = np.array(synthese[CODE_COL])
+    synthese_energy = to_float(synthese[ENERGY_COL])
+    order = np.argsort(synthese_codes, kind="stable")
+    positions = np.searchsorted(synthese_codes[order], codes).clip(max=len(order) - 1) if len(order) else None
+    energy = np.zeros(len(codes))
+    if positions is not None:
+        found = synthese_codes[order][positions] == codes
+        energy[found] = synthese_energy[order][positions[found]]
+
+    keep = first_occurrences(names_fr)
+    codes, names_fr, names_en = codes[keep], names_fr[keep], names_en[keep]
+    impacts = np.stack([co2[keep], water[keep], energy[keep]])
+    name_ids = canonical_ids(names_en)
+
+    unique = first_occurrences(name_ids)
+    return FactorArtifact(name_ids[unique], impacts[:, unique], name_ids, names_fr, names_en, codes)
+
+
+def run(out: Path = ARTIFACT_PATH, force: bool = False) -> bool:
+    """Rebuild the artifact if the inputs changed; returns whether it was written"""
+    inputs_sha256 = file_sha256(DETAIL_PATH, SYNTHESE_PATH, salt=ETL_VERSION)
+    if not force and out.exists() and FactorArtifact.load(out).inputs_sha256 == inputs_sha256:
+        print(f"✅ Agribalyse inputs unchanged, {out} is up to date")
+        return False
+
+    start = time.perf_counter()
+    artifact = build(DETAIL_PATH, SYNTHESE_PATH)
+    artifact.inputs_sha256 = inputs_sha256
+    artifact.save(out)
+    print(f"✅ {len(artifact)} LCA factors ({len(artifact.name_ids)} products) written to {out} "
+          f"in {(time.perf_counter() - start) * 1000:.0f} ms")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--out", type=Path, default=ARTIFACT_PATH)
+    parser.add_argument("--force", action="store_true", help="rebuild even if the inputs are unchanged")
+    args = parser.parse_args()
+    run(args.out, args.force)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Columnar LCA factors artifact produced by etl_agribalyse.py.
+
+One compressed .npz file holds two tables as column arrays:
+- factors: one entry per ingredient_id with its impacts (IMPACTS order),
+  loaded into lca_factors (factor_loader) and the in-memory FactorTable;
+- names: every Agribalyse product kept by the ETL (French and English name,
+  Code AGB) with its ingredient_id, indexed by the ingredient matcher. Several
+  products can share one ingredient_id.
+plus the checksums used to skip unchanged work: the SHA-256 of the ETL inputs
+and of the factors table itself.
+"""
+import hashlib
+import os
+from pathlib import Path
+from typing import Iterator, Tuple
+
+import numpy as np
+
+ARTIFACT_PATH = Path(os.getenv("LCA_FACTORS_ARTIFACT", "Csv files/lca_factors.npz"))
+
+
+def file_sha256(*paths: Path, salt: str = "") -> str:
+    digest = hashlib.sha256(salt.encode())
+    for path in paths:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def factors_sha256(ids: np.ndarray, impacts: np.ndarray) -> str:
+    digest = hashlib.sha256("\n".join(ids.tolist()).encode())
+    digest.update(np.ascontiguousarray(impacts, dtype="<f8").tobytes())
+    return digest.hexdigest()
+
+
+class FactorArtifact:
+    def __init__(
+        self,
+        factor_ids: np.ndarray,
+        impacts: np.ndarray,
+        name_ids: np.ndarray,
+        names_fr: np.ndarray,
+        names_en: np.ndarray,
+        codes: np.ndarray,
+        inputs_sha256: str = "",
+        source: str = "",
+    ):
+        """`impacts` has one row per impact (factor_table.IMPACTS order) and one column per factor id"""
+        self.factor_ids = factor_ids
+        self.impacts = impacts
+        self.name_ids = name_ids
+        self.names_fr = names_fr
+        self.names_en = names_en
+        self.codes = codes
+        self.inputs_sha256 = inputs_sha256
+        self.source = source
+        self.checksum = factors_sha256(factor_ids, impacts)
+
+    @classmethod
+    def load(cls, path: Path = ARTIFACT_PATH) -> "FactorArtifact":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                data["factor_ids"], data["impacts"], data["name_ids"],
+                data["names_fr"], data["names_en"], data["codes"], str(data["inputs_sha256"]), str(path)
+            )
+
+    def save(self, path: Path = ARTIFACT_PATH):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Written next to the target, then renamed: readers never see a partial file
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.savez_compressed(
+                f,
+                factor_ids=self.factor_ids,
+                impacts=self.impacts,
+                name_ids=self.name_ids,
+                names_fr=self.names_fr,
+                names_en=self.names_en,
+                codes=self.codes,
+                inputs_sha256=np.array(self.inputs_sha256),
+            )
+        tmp.replace(path)
+
+    def __len__(self) -> int:
+        return len(self.factor_ids)
+
+    def rows(self) -> Iterator[Tuple[str, float, float, float]]:
+        """(ingredient_id, *IMPACTS) per factor, as in the lca_factors table"""
+        return zip(self.factor_ids.tolist(), *self.impacts.tolist())
+
+    def names(self) -> Iterator[Tuple[str, str, str]]:
+        """(ingredient_id, French name, English name) per Agribalyse product"""
+        return zip(self.name_ids.tolist(), self.names_fr.tolist(), self.names_en.tolist())
+
@@ -0,0 +1,133 @@
+"""
+Loads lca_factors from the factors artifact (see etl_agribalyse.py).
+
+The factors are streamed into a staging table with COPY, then swapped in
+place of lca_factors inside the same transaction, so readers see either the
+old or the new factors and never a half-loaded table. Every load is recorded
+in lca_factors_versions with the SHA-256 of the factors; factors whose
+checksum matches the current version are not loaded again, so the loader can
+run on every startup (and on POST /lca/factors/reload) and only does work
+when the artifact has changed.
+"""
+import csv
+import io
+import time
+from typing import Optional
+
+from factor_artifact import FactorArtifact
+from factor_table import IMPACTS
+
+COLUMNS = ("ingredient_id",) + IMPACTS
+# pg_advisory_xact_lock key: replicas starting together create the tables and load the CSV once
+LOCK_KEY = 0x4C434146
+
+
+def create_tables(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS lca_factors (
+            ingredient_id TEXT PRIMARY KEY,
+            co2_per_kg DOUBLE PRECISION,
+            water_L_per_kg DOUBLE PRECISION,
+            energy_MJ_per_kg DOUBLE PRECISION
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS lca_factors_versions (
+            version SERIAL PRIMARY KEY,
+            checksum TEXT NOT NULL,
+            source TEXT NOT NULL,
+            row_count INTEGER NOT NULL,
+            load_ms DOUBLE PRECISION NOT NULL,
+            loaded_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    """)
+
+
+def current_version(cursor) -> Optional[dict]:
+    cursor.execute(
+        "SELECT version, checksum, source, row_count, load_ms, loaded_at "
+        "FROM lca_factors_versions ORDER BY version DESC LIMIT 1"
+    )
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    version, checksum, source, row_count, load_ms, loaded_at = row
+    return {
+        "version": version,
+        "checksum": checksum,
+        "source": source,
+        "rows": row_count,
+        "load_ms": load_ms,
+        "loaded_at": loaded_at.isoformat() if loaded_at else None,
+    }
+
+
+def read_version(conn) -> Optional[dict]:
+    """Version of the factors currently in lca_factors (None before the first load)"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT to_regclass('lca_factors_versions')")
+        return current_version(cursor) if cursor.fetchone()[0] else None
+    finally:
+        cursor.close()
+
+
+def copy_to_staging(cursor, artifact: FactorArtifact) -> int:
+    cursor.execute("DROP TABLE IF EXISTS lca_factors_staging")
+    cursor.execute("""
+        CREATE TABLE lca_factors_staging (
+            ingredient_id TEXT NOT NULL,
+            co2_per_kg DOUBLE PRECISION,
+            water_L_per_kg DOUBLE PRECISION,
+            energy_MJ_per_kg DOUBLE PRECISION
+        )
+    """)
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(artifact.rows())
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY lca_factors_staging ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    # Built after the COPY, which is faster than maintaining it row by row;
+    # a duplicate ingredient_id fails the load here and keeps the old factors
+    cursor.execute("ALTER TABLE lca_factors_staging ADD CONSTRAINT lca_factors_staging_pkey PRIMARY KEY (ingredient_id)")
+    cursor.execute("SELECT COUNT(*) FROM lca_factors_staging")
+    return cursor.fetchone()[0]
+
+
+def swap_in_staging(cursor):
+    cursor.execute("DROP TABLE lca_factors")
+    cursor.execute("ALTER TABLE lca_factors_staging RENAME TO lca_factors")
+    cursor.execute("ALTER INDEX lca_factors_staging_pkey RENAME TO lca_factors_pkey")
+
+
+def load_factors(conn, artifact: FactorArtifact, force: bool = False) -> dict:
+    """
+    Make lca_factors match the artifact's factors. Returns the current version
+    and whether this call loaded it ("loaded") or found it up to date ("unchanged").
+    """
+    start = time.perf_counter()
+    checksum = artifact.checksum
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", (LOCK_KEY,))
+        create_tables(cursor)
+        current = current_version(cursor)
+        if not force and current is not None and current["checksum"] == checksum:
+            conn.commit()
+            return {**current, "status": "unchanged"}
+
+        rows = copy_to_staging(cursor, artifact)
+        swap_in_staging(cursor)
+        load_ms = (time.perf_counter() - start) * 1000
+        cursor.execute(
+            "INSERT INTO lca_factors_versions (checksum, source, row_count, load_ms) "
+            "VALUES (%s, %s, %s, %s)",
+            (checksum, artifact.source, rows, load_ms)
+        )
+        current = current_version(cursor)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    return {**current, "status": "loaded"}
@@ -0,0 +1,84 @@
+"""
+In-memory copy of the lca_factors table.
+
+The table is small (~2,400 rows), so it is loaded once and kept as an
+ingredient_id -> index dict plus one contiguous float64 array per impact.
+Computing a product is then a dict lookup per ingredient and a vector gather,
+without any database round trip.
+"""
+import time
+from typing import Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+
+IMPACTS = ("co2_per_kg", "water_L_per_kg", "energy_MJ_per_kg")
+
+
+def normalize_to_db(ing: str):
+    return "ingredient:" + ing.lower().strip().replace(" ", "_")
+
+
+class FactorTable:
+    def __init__(self, ids: Sequence[str], values: np.ndarray, source: str = "", version: Optional[int] = None):
+        """`values` has one row per impact (IMPACTS order) and one column per id"""
+        self.ids = list(ids)
+        self.index = {ingredient_id: i for i, ingredient_id in enumerate(self.ids)}
+        # Unknown ingredients point at an extra all-zero column
+        self.missing = len(self.ids)
+        self.values = np.zeros((len(IMPACTS), len(self.ids) + 1), dtype=np.float64)
+        self.values[:, :len(self.ids)] = values
+        self.co2, self.water, self.energy = self.values
+        self.source = source
+        # lca_factors_versions.version the factors were read at (see factor_loader)
+        self.version = version
+        self.loaded_at = time.time()
+
+    @classmethod
+    def from_rows(
+        cls, rows: Iterable[Tuple[str, float, float, float]], source: str = "", version: Optional[int] = None
+    ) -> "FactorTable":
+        rows = list(rows)
+        ids = [row[0] for row in rows]
+        values = np.array([row[1:] for row in rows], dtype=np.float64).reshape(-1, len(IMPACTS)).T
+        return cls(ids, values, source, version)
+
+    @classmethod
+    def from_db(cls, conn, version: Optional[int] = None) -> "FactorTable":
+        cursor = conn.cursor()
+        cursor.execute("SELECT ingredient_id, co2_per_kg, water_L_per_kg, energy_MJ_per_kg FROM lca_factors")
+        rows = cursor.fetchall()
+        cursor.close()
+        return cls.from_rows(rows, source="lca_factors", version=version)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def indexes(self, ingredient_ids: Iterable[str]) -> np.ndarray:
+        return np.fromiter((self.index.get(i, self.missing) for i in ingredient_ids), dtype=np.intp)
+
+    def impacts(self, columns: np.ndarray, masses_kg: Sequence[float]) -> Tuple[np.ndarray, np.ndarray]:
+        """(3 x n impacts of the given columns (see indexes()) and masses, n missing flags)"""
+        return self.values[:, columns] * np.asarray(masses_kg, dtype=np.float64), columns == self.missing
+
+    def product_totals(
+        self, rows: np.ndarray, columns: np.ndarray, masses_kg: np.ndarray, n_products: int
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Impacts of a whole batch. (rows[k], columns[k], masses_kg[k]) are the
+        non-zero entries of a sparse product x factor mass matrix M, columns
+        being indexes into this table (see indexes()); the totals M @ factors
+        are one weighted bincount per impact.
+        Returns (3 x n_products totals, 3 x k entry impacts, k missing flags).
+        """
+        impacts = self.values[:, columns] * masses_kg
+        totals = np.stack([np.bincount(rows, weights=impact, minlength=n_products) for impact in impacts])
+        return totals, impacts, columns == self.missing
+
+    def stats(self) -> dict:
+        return {
+            "factors": len(self),
+            "source": self.source,
+            "version": self.version,
+            "loaded_at": self.loaded_at,
+            "memory_bytes": int(self.values.nbytes),
+        }
@@ -0,0 +1,183 @@
+"""
+Fuzzy matching of ingredient names (as extracted by the NLP service) to
+lca_factors ids.
+
+The index is built once from the French and English Agribalyse names of the
+factors artifact (lca_factors.npz): names are accent-folded, stripped of stop words
+and plurals, cut into character trigrams, and stored as a trigram -> name
+inverted index. A query only touches the postings of its own trigrams and
+scores candidates with the Dice coefficient of the trigram sets.
+
+Curated aliases (ingredient_aliases.csv) take precedence over the fuzzy
+search, for names the Agribalyse wording does not match well
+("farine de blé" vs "Farine de blé tendre ou froment T55"). An alias with an
+empty ingredient_id marks a name without any Agribalyse factor ("vanilline"),
+which is reported as unmatched instead of fuzzy-matched to a lookalike.
+"""
+import csv
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Container, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from factor_artifact import FactorArtifact
+ALIASES_PATH = Path(os.getenv("LCA_ALIASES_PATH", "Csv files/ingredient_aliases.csv"))
+# Below this score an ingredient is reported as missing_factor
+MIN_SCORE = float(os.getenv("LCA_MATCH_MIN_SCORE", "0.6"))
+CACHE_SIZE = int(os.getenv("LCA_MATCH_CACHE_SIZE", "20000"))
+
+# Words of the unprocessed variants, preferred on equal scores
+RAW_WORDS = {"cru", "crue", "frai", "fraiche", "raw", "fresh"}
+
+STOP_WORDS = {
+    "a", "au", "aux", "d", "de", "des", "du", "en", "et", "l", "la", "le", "les", "ou",
+    "and", "in", "of", "or", "the", "with",
+}
+
+
+def fold(name: str) -> str:
+    """'Œufs frais de poule' -> 'oeuf frai poule'"""
+    name = name.lower().replace("œ", "oe").replace("æ", "ae")
+    name = "".join(c for c in unicodedata.normalize("NFKD", name) if not unicodedata.combining(c))
+    words = [w for w in re.sub(r"[^a-z0-9]+", " ", name).split() if w not in STOP_WORDS]
+    # Crude singular: "noisettes" and "noisette" share all their trigrams
+    return " ".join(w[:-1] if len(w) > 3 and w[-1] in "sx" else w for w in words)
+
+
+def trigrams(folded: str) -> set:
+    padded = f"  {folded} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class IngredientMatcher:
+    def __init__(
+        self,
+        entries: List[Tuple[str, str]],
+        aliases: Optional[Dict[str, Optional[str]]] = None,
+        min_score: float = MIN_SCORE,
+        cache_size: int = CACHE_SIZE,
+    ):
+        """`entries` are (name, ingredient_id) pairs; one id usually has several names"""
+        self.min_score = min_score
+        self.aliases = {fold(alias): ingredient_id for alias, ingredient_id in (aliases or {}).items()}
+
+        seen: Dict[Tuple[str, str], int] = {}
+        self.names: List[str] = []
+        self.ids: List[str] = []
+        name_sizes, name_lengths, name_raw = [], [], []
+        postings: Dict[str, List[int]] = {}
+        for name, ingredient_id in entries:
+            raw = not RAW_WORDS.isdisjoint(fold(name).split())
+            # "Beurre à 82% MG, doux" is also indexed as "Beurre à 82% MG"
+            for variant in {name, name.split(",")[0]}:
+                folded = fold(variant)
+                if not folded or (folded, ingredient_id) in seen:
+                    continue
+                index = seen[(folded, ingredient_id)] = len(self.names)
+                self.names.append(folded)
+                self.ids.append(ingredient_id)
+                grams = trigrams(folded)
+                name_sizes.append(len(grams))
+                name_lengths.append(len(name))
+                name_raw.append(raw)
+                for gram in grams:
+                    postings.setdefault(gram, []).append(index)
+
+        self.postings = {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+        self.name_sizes = np.array(name_sizes, dtype=np.float64)
+        # Equal scores go to raw variants first, then to the shortest source name:
+        # "pomme" is "Pomme, pulpe, crue" rather than "Pomme, séchée"
+        self.name_lengths = np.array(name_lengths, dtype=np.int32)
+        self.name_cooked = ~np.array(name_raw, dtype=bool)
+
+        self._cache: "OrderedDict[str, Tuple[Optional[str], float]]" = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+        self.counters = {"alias": 0, "fuzzy": 0, "unmatched": 0}
+
+    @classmethod
+    def from_artifact(
+        cls, artifact: FactorArtifact, aliases_path: Path = ALIASES_PATH, known_ids: Optional[Container[str]] = None
+    ) -> "IngredientMatcher":
+        """Index the Agribalyse names; ids missing from `known_ids` (the loaded factors) are skipped"""
+        entries = []
+        for ingredient_id, name_fr, name_en in artifact.names():
+            if known_ids is not None and ingredient_id not in known_ids:
+                continue
+            entries.append((name_fr, ingredient_id))
+            entries.append((name_en, ingredient_id))
+            entries.append((ingredient_id.split(":", 1)[1].replace("_", " "), ingredient_id))
+
+        aliases = {}
+        if aliases_path.exists():
+            with open(aliases_path, newline="", encoding="utf-8") as f:
+                for row in csv.DictReader(f):
+                    ingredient_id = row["ingredient_id"] or None
+                    if ingredient_id is None or known_ids is None or ingredient_id in known_ids:
+                        aliases[row["alias"]] = ingredient_id
+        return cls(entries, aliases)
+
+    def search(self, name: str, k: int = 5) -> List[Tuple[str, str, float]]:
+        """Top-k (ingredient_id, indexed name, score) candidates, one per id, best first"""
+        grams = trigrams(fold(name))
+        hits = [self.postings[gram] for gram in grams if gram in self.postings]
+        if not hits:
+            return []
+        shared = np.bincount(np.concatenate(hits), minlength=len(self.names))
+        scores = 2 * shared / (len(grams) + self.name_sizes)
+
+        # Several names per id: look further than k to return k distinct ids,
+        # keeping every name tied with the last one so the tie-break sees them all
+        limit = min(len(scores), k * 4)
+        threshold = scores[np.argpartition(-scores, limit - 1)[limit - 1]]
+        top = np.flatnonzero(scores >= threshold)
+        order = np.lexsort((self.name_lengths[top], self.name_cooked[top], -scores[top]))
+        results, seen = [], set()
+        for i in top[order].tolist():
+            if shared[i] == 0 or self.ids[i] in seen:
+                continue
+            seen.add(self.ids[i])
+            results.append((self.ids[i], self.names[i], round(float(scores[i]), 3)))
+            if len(results) == k:
+                break
+        return results
+
+    def _match(self, name: str) -> Tuple[Optional[str], float, str]:
+        folded = fold(name)
+        if folded in self.aliases:
+            alias = self.aliases[folded]
+            return alias, 1.0 if alias else 0.0, "alias"
+        candidates = self.search(name, k=1)
+        if candidates and candidates[0][2] >= self.min_score:
+            return candidates[0][0], candidates[0][2], "fuzzy"
+        return None, candidates[0][2] if candidates else 0.0, "unmatched"
+
+    def match(self, name: str) -> Tuple[Optional[str], float]:
+        """(ingredient_id or None, score); results are memoized per name"""
+        with self._lock:
+            cached = self._cache.get(name)
+            if cached is not None:
+                self._cache.move_to_end(name)
+                return cached
+        ingredient_id, score, kind = self._match(name)
+        self.counters[kind] += 1
+        with self._lock:
+            self._cache[name] = (ingredient_id, score)
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return ingredient_id, score
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "indexed_names": len(self.names),
+            "trigrams": len(self.postings),
+            "aliases": len(self.aliases),
+            "min_score": self.min_score,
+            "cached": len(self._cache),
+        }
@@ -1,84 +1,99 @@
-import csv
-from pathlib import Path
-
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
-import re
-from sqlalchemy.orm import Session
+import os
 
-from database.connection import get_db, Base, engine
+from database.connection import Base, engine, pool_metrics
 from database.models import LCAResult
+from factor_artifact import ARTIFACT_PATH, FactorArtifact
+from factor_loader import load_factors, read_version
+from factor_table import FactorTable
+from ingredient_matcher import IngredientMatcher
+from calculation import calculate_batch, calculate_product
+from ecolabel_common.write_behind import WriteBehindQueue, WriteQueueFull
 
-import psycopg2  # kept for existing factor queries
 import requests
 import socket
+import threading
 
 
 # -------- Create tables --------
 Base.metadata.create_all(bind=engine)
 
-CSV_PATH = Path("Csv files/lca_factors_import_unique.csv")
+# LCA results are archived in the background, in bulk
+results_writer = WriteBehindQueue(engine, LCAResult)
+
+# A batch is archived all at once, so it can never be larger than the write queue
+MAX_BATCH_PRODUCTS = min(int(os.getenv("LCA_MAX_BATCH_PRODUCTS", "10000")), results_writer.max_queue)
+
+# Factors are read once at startup, then every lookup is served from memory
+factors = FactorTable.from_rows([])
+# Names without an exact canonical id are matched fuzzily against the Agribalyse names
+matcher = None
+# Every worker of every replica checks the factors version this often and rebuilds
+# its in-memory table when another process loaded new factors (0 disables the check)
+FACTOR_REFRESH_SECONDS = float(os.getenv("LCA_FACTOR_REFRESH_SECONDS", "30"))
+factor_refresh_stopped = threading.Event()
+factor_table_lock = threading.Lock()
+
+
+# -------- PostgreSQL helper for factors --------
+def get_factor_db():
+    """DBAPI connection from the shared engine pool (COPY needs the raw cursor); close() returns it"""
+    return engine.raw_connection()
 
 
-def load_lca_factors_if_empty():
+def load_factors_from_artifact(force: bool = False) -> dict:
+    """COPY the artifact's factors into lca_factors if their checksum changed since the last load"""
+    conn = get_factor_db()
+    try:
+        result = load_factors(conn, FactorArtifact.load(ARTIFACT_PATH), force=force)
+    finally:
+        conn.close()
+    if result["status"] == "loaded":
+        print(f"✅ {result['rows']} LCA factors loaded in {result['load_ms']:.0f} ms (version {result['version']})")
+    else:
+        print(f"✅ LCA factors up to date (version {result['version']})")
+    return result
+
+
+def load_factor_table():
+    global factors, matcher
+    with factor_table_lock:
+        conn = get_factor_db()
+        try:
+            version = read_version(conn)
+            table = FactorTable.from_db(conn, version=version["version"] if version else None)
+        finally:
+            conn.close()
+        table_matcher = IngredientMatcher.from_artifact(FactorArtifact.load(ARTIFACT_PATH), known_ids=table.index)
+        # Both are swapped together, once fully built
+        factors, matcher = table, table_matcher
+    print(f"✅ {len(factors)} LCA factors cached in memory (version {factors.version})")
+    print(f"✅ Ingredient matcher: {len(matcher.names)} names, {len(matcher.aliases)} aliases")
+
+
+def refresh_factor_table() -> bool:
+    """Rebuild the in-memory table if lca_factors holds another version; returns whether it did"""
     conn = get_factor_db()
-    cursor = conn.cursor()
-    cursor.execute("""
-                   CREATE TABLE IF NOT EXISTS lca_factors
-                   (
-                       ingredient_id
-                       TEXT
-                       PRIMARY
-                       KEY,
-                       co2_per_kg
-                       DOUBLE
-                       PRECISION,
-                       water_L_per_kg
-                       DOUBLE
-                       PRECISION,
-                       energy_MJ_per_kg
-                       DOUBLE
-                       PRECISION
-                   )
-                   """)
-    conn.commit()
-    cursor.execute("SELECT COUNT(*) FROM lca_factors")
-    count = cursor.fetchone()[0]
-
-    if count > 0:
-        print("✅ LCA factors already loaded")
-        cursor.close()
+    try:
+        version = read_version(conn)
+    finally:
         conn.close()
-        return
-
-    print("📥 Loading LCA factors from CSV...")
-
-    with open(CSV_PATH, newline="", encoding="utf-8") as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            cursor.execute(
-                """
-                INSERT INTO lca_factors (
-                    ingredient_id,
-                    co2_per_kg,
-                    water_L_per_kg,
-                    energy_MJ_per_kg
-                )
-                VALUES (%s, %s, %s, %s)
-                ON CONFLICT (ingredient_id) DO NOTHING
-                """,
-                (
-                    row["ingredient_id"],
-                    float(row["co2_per_kg"]),
-                    float(row["water_L_per_kg"]),
-                    float(row["energy_MJ_per_kg"]),
-                ),
-            )
-
-    conn.commit()
-    cursor.close()
-    conn.close()
-    print("✅ LCA factors loaded successfully")
+    if version is None or version["version"] == factors.version:
+        return False
+    print(f"🔄 LCA factors version {version['version']} loaded elsewhere (cached: {factors.version})")
+    load_factor_table()
+    return True
+
+
+def watch_factor_version():
+    while not factor_refresh_stopped.wait(FACTOR_REFRESH_SECONDS):
+        try:
+            refresh_factor_table()
+        except Exception as e:
+            print(f"⚠️ LCA factors version check failed: {e}")
+
+
 # -------- Request Model --------
 class MS2Output(BaseModel):
     product_name: str
@@ -86,42 +101,25 @@ class MS2Output(BaseModel):
     ingredients: list[str]
 
 
-# -------- Weight distribution --------
-def estimate_ingredients_weight(total_weight_g, ingredients):
-    n = len(ingredients)
-    if n == 0:
-        return {}
-
-    raw_weights = [n - i for i in range(n)]
-    total_raw = sum(raw_weights)
-
-    return {
-        ing: round((w / total_raw) * total_weight_g, 2)
-        for ing, w in zip(ingredients, raw_weights)
-    }
+class MS2Batch(BaseModel):
+    products: list[MS2Output]
 
 
 app = FastAPI(title="EcoLabel-MS3 LCA Calculator")
 
 
-# -------- PostgreSQL helper for factors --------
-def get_factor_db():
-    return psycopg2.connect(
-        host="postgres-lca",
-        database="lca_lite",
-        user="lca_user",
-        password="lca_pass"
-    )
-
 CONSUL_URL = "http://consul:8500/v1/agent/service/register"
 
 def register_service(name: str, service_name: str, port: int):
+    address = socket.gethostbyname(socket.gethostname())
+    # One ID per replica so scaled-out instances do not overwrite each other
     payload = {
+        "ID": f"{service_name}-{socket.gethostname()}",
         "Name": name,
-        "Address": socket.gethostbyname(socket.gethostname()),
+        "Address": address,
         "Port": port,
         "Check": {
-            "HTTP": f"http://{service_name}:{port}/health",
+            "HTTP": f"http://{address}:{port}/health",
             "Interval": "10s"
         }
     }
@@ -130,98 +128,122 @@ def register_service(name: str, service_name: str, port: int):
 @app.on_event("startup")
 def startup():
     register_service("LCA-LITE", "lca-lite", 8003)
-    load_lca_factors_if_empty()
-
-@app.post("/lca/calc")
-def calculate_lca(ms2: MS2Output, db: Session = Depends(get_db)):
-
-    # STEP 1 — Extract weight
-    match = re.match(r"(\d+)", ms2.weight.lower().strip())
-    total_weight_g = int(match.group(1)) if match else 100
-
-    # STEP 2 — Estimate ingredient masses
-    ingredient_masses = estimate_ingredients_weight(total_weight_g, ms2.ingredients)
-
-    # STEP 3 — Query factor database
-    conn = get_factor_db()
-    cursor = conn.cursor()
-
-    total_co2 = 0.0
-    total_water = 0.0
-    total_energy = 0.0
-    breakdown = []
-
-    def normalize_to_db(ing: str):
-        return "ingredient:" + ing.lower().strip().replace(" ", "_")
-
-    for ing_name, mass_g in ingredient_masses.items():
-
-        ing_id = normalize_to_db(ing_name)
-
-        cursor.execute("""
-            SELECT co2_per_kg, water_L_per_kg, energy_MJ_per_kg
-            FROM lca_factors
-            WHERE ingredient_id = %s
-        """, (ing_id,))
-
-        row = cursor.fetchone()
-
-        if row:
-            co2_per_kg, water_L_per_kg, energy_MJ_per_kg = map(float, row)
-            missing = False
-        else:
-            co2_per_kg = water_L_per_kg = energy_MJ_per_kg = 0.0
-            missing = True
-
-        mass_kg = mass_g / 1000.0
-
-        co2 = co2_per_kg * mass_kg
-        water = water_L_per_kg * mass_kg
-        energy = energy_MJ_per_kg * mass_kg
+    load_factors_from_artifact()
+    load_factor_table()
+    if FACTOR_REFRESH_SECONDS > 0:
+        threading.Thread(target=watch_factor_version, name="factor-refresh", daemon=True).start()
+
+@app.on_event("shutdown")
+def shutdown():
+    factor_refresh_stopped.set()
+    results_writer.stop()
+
+@app.get("/debug/factors")
+def debug_factors():
+    return factors.stats()
+
+@app.post("/lca/factors/reload")
+def reload_factors(force: bool = False):
+    """Load the factors artifact if it changed and refresh this process; other workers and replicas follow on their next version check"""
+    result = load_factors_from_artifact(force=force)
+    if result["version"] != factors.version:
+        load_factor_table()
+    return {**result, "cached_version": factors.version}
+
+@app.get("/debug/matcher")
+def debug_matcher():
+    return matcher.stats() if matcher else {}
+
+@app.get("/lca/match")
+def match_ingredient(name: str, k: int = 5):
+    """Candidate factors for an ingredient name, with their similarity scores"""
+    if matcher is None:
+        raise HTTPException(status_code=503, detail="Ingredient matcher not loaded")
+    ingredient_id, score = matcher.match(name)
+    return {
+        "name": name,
+        "match": ingredient_id,
+        "score": score,
+        "candidates": [
+            {"ingredient_id": candidate, "matched_name": matched_name, "score": candidate_score}
+            for candidate, matched_name, candidate_score in matcher.search(name, k)
+        ]
+    }
 
-        total_co2 += co2
-        total_water += water
-        total_energy += energy
+@app.get("/debug/pool")
+def debug_pool():
+    return pool_metrics.stats(engine.pool)
 
-        breakdown.append({
-            "ingredient": ing_name,
-            "mass_g": mass_g,
-            "co2_g": co2 * 1000,
-            "water_L": water,
-            "energy_MJ": energy,
-            "missing_factor": missing
-        })
+@app.get("/debug/write-behind")
+def debug_write_behind():
+    return results_writer.stats()
 
-    cursor.close()
-    conn.close()
+@app.post("/lca/calc")
+def calculate_lca(ms2: MS2Output):
 
-    total_impacts = {
-        "co2_g": round(total_co2 * 1000, 3),
-        "water_L": round(total_water, 3),
-        "energy_MJ": round(total_energy, 3),
-    }
+    # STEPS 1-3 — Weight, ingredient masses, factors from the in-memory table
+    total_impacts, breakdown = calculate_product(factors, ms2.weight, ms2.ingredients, matcher)
 
     # -------- STEP 4 — Save results to PostgreSQL --------
-    db_entry = LCAResult(
-        product_name=ms2.product_name,
-        total_co2_g=total_impacts["co2_g"],
-        total_water_L=total_impacts["water_L"],
-        total_energy_MJ=total_impacts["energy_MJ"],
-        ingredients_breakdown=breakdown
-    )
-
-    db.add(db_entry)
-    db.commit()
-    db.refresh(db_entry)
+    try:
+        lca_id = results_writer.submit({
+            "product_name": ms2.product_name,
+            "total_co2_g": total_impacts["co2_g"],
+            "total_water_L": total_impacts["water_L"],
+            "total_energy_MJ": total_impacts["energy_MJ"],
+            "ingredients_breakdown": breakdown
+        })
+    except WriteQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
 
     # -------- Return extended response with DB ID --------
     return {
-        "lca_id": db_entry.id,
+        "lca_id": lca_id,
         "product_name": ms2.product_name,
         "total_impacts": total_impacts,
         "ingredients_breakdown": breakdown,
         "saved": True
     }
+@app.post("/lca/calc/batch")
+def calculate_lca_batch(batch: MS2Batch):
+    """Many products in one call (catalogue recomputes); results are returned in input order"""
+
+    products = batch.products
+    if len(products) > MAX_BATCH_PRODUCTS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_PRODUCTS} products per batch")
+    if not products:
+        return {"results": []}
+
+    # Every product of the batch is computed in one pass over the factor arrays
+    computed = calculate_batch(factors, [(ms2.weight, ms2.ingredients) for ms2 in products], matcher)
+
+    try:
+        ids = results_writer.submit_many([
+            {
+                "product_name": ms2.product_name,
+                "total_co2_g": total_impacts["co2_g"],
+                "total_water_L": total_impacts["water_L"],
+                "total_energy_MJ": total_impacts["energy_MJ"],
+                "ingredients_breakdown": breakdown
+            }
+            for ms2, (total_impacts, breakdown) in zip(products, computed)
+        ])
+    except WriteQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    return {
+        "results": [
+            {
+                "lca_id": lca_id,
+                "product_name": ms2.product_name,
+                "total_impacts": total_impacts,
+                "ingredients_breakdown": breakdown,
+                "saved": True
+            }
+            for lca_id, ms2, (total_impacts, breakdown) in zip(ids, products, computed)
+        ]
+    }
+
 @app.get("/health")
 def health():
     return {"status": "UP"}
@@ -0,0 +1,140 @@
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+from transformers import AutoConfig
+
+# torch | onnx | onnx-int8
+NLP_BACKEND = os.getenv("NLP_BACKEND", "torch")
+# Exported ONNX graphs are written next to the model (or a temp dir if read-only) unless overridden
+ONNX_DIR = os.getenv("NLP_ONNX_DIR")
+ONNX_THREADS = int(os.getenv("NLP_ONNX_THREADS", "0"))
+# Map model.safetensors instead of copying it: pages are shared by every process
+MMAP_WEIGHTS = os.getenv("NLP_MMAP_WEIGHTS", "true").lower() == "true"
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+
+# torch is imported lazily: ONNX deployments never pay for it at startup
+class TorchRunner:
+    name = "torch"
+
+    def __init__(self, model):
+        self.model = model.eval()
+        self.config = model.config
+
+    def __call__(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        import torch
+
+        with torch.no_grad():
+            logits = self.model(
+                input_ids=torch.from_numpy(input_ids),
+                attention_mask=torch.from_numpy(attention_mask)
+            ).logits
+        return logits.numpy()
+
+
+class OnnxRunner:
+    def __init__(self, path: Path, config, name: str):
+        self.path = path
+        self.config = config
+        self.name = name
+        self._session = None
+        self._pid = None
+
+    @property
+    def session(self):
+        # Created per process: ONNX Runtime thread pools are not fork-safe
+        if self._pid != os.getpid():
+            import onnxruntime as ort
+
+            options = ort.SessionOptions()
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            if ONNX_THREADS:
+                options.intra_op_num_threads = ONNX_THREADS
+            self._session = ort.InferenceSession(str(self.path), options, providers=["CPUExecutionProvider"])
+            self._pid = os.getpid()
+        return self._session
+
+    def __call__(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        return self.session.run(["logits"], {"input_ids": input_ids, "attention_mask": attention_mask})[0]
+
+
+def load_torch_model(model_path: str):
+    """
+    Token-classification model whose parameters point straight into the
+    memory-mapped safetensors file (read-only, page-cache backed), so pre-forked
+    workers and co-located replicas share a single copy of the weights.
+    """
+    from transformers import AutoModelForTokenClassification
+
+    weights = Path(model_path, "model.safetensors")
+    if not (MMAP_WEIGHTS and weights.exists()):
+        return AutoModelForTokenClassification.from_pretrained(model_path)
+
+    from safetensors.torch import load_file
+
+    model = AutoModelForTokenClassification.from_config(AutoConfig.from_pretrained(model_path))
+    try:
+        model.load_state_dict(load_file(str(weights)), assign=True)
+    except RuntimeError as e:
+        # Checkpoint naming differs from the model class: let transformers remap it
+        print(f"mmap load failed ({e}), falling back to from_pretrained")
+        return AutoModelForTokenClassification.from_pretrained(model_path)
+    return model
+
+
+def export_onnx(model_path: str, target: Path):
+    """Export the token-classification model with dynamic batch and sequence axes"""
+    import torch
+    from transformers import AutoModelForTokenClassification
+
+    model = AutoModelForTokenClassification.from_pretrained(model_path).eval()
+    dummy = torch.ones((1, 8), dtype=torch.long)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    axes = {0: "batch", 1: "sequence"}
+    torch.onnx.export(
+        model,
+        (dummy, dummy),
+        str(target),
+        input_names=["input_ids", "attention_mask"],
+        output_names=["logits"],
+        dynamic_axes={"input_ids": axes, "attention_mask": axes, "logits": axes},
+        opset_version=17,
+        dynamo=False,
+    )
+
+
+def quantize_onnx(source: Path, target: Path):
+    """int8 dynamic quantization of the MatMul weights (activations stay float)"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(str(source), str(target), weight_type=QuantType.QInt8)
+
+
+def load_backend(model_path: str, name: str = NLP_BACKEND):
+    """Return a callable (input_ids, attention_mask) -> logits with a `.config`"""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown NLP_BACKEND {name!r}, expected one of {BACKENDS}")
+
+    if name == "torch":
+        return TorchRunner(load_torch_model(model_path))
+
+    onnx_dir = Path(ONNX_DIR or os.path.join(model_path, "onnx"))
+    if not ONNX_DIR and not os.access(model_path, os.W_OK):
+        # Model mounted read-only (docker-compose): keep exports in a writable cache
+        onnx_dir = Path(tempfile.gettempdir(), "nlp-onnx", Path(model_path).name)
+    fp32 = onnx_dir / "model.onnx"
+    if not fp32.exists():
+        print(f"Exporting {model_path} to {fp32}")
+        export_onnx(model_path, fp32)
+
+    path = fp32
+    if name == "onnx-int8":
+        path = onnx_dir / "model-int8.onnx"
+        if not path.exists():
+            print(f"Quantizing {fp32} to {path}")
+            quantize_onnx(fp32, path)
+
+    return OnnxRunner(path, AutoConfig.from_pretrained(model_path), name)
@@ -0,0 +1,91 @@
+"""
+Startup time, memory footprint and per-request latency of each inference
+backend. Every backend is measured in a fresh process so that memory and
+startup numbers are not polluted by the others.
+
+Usage: MODEL_PATH=/models/bert python benchmark_backends.py [--backends torch,onnx,onnx-int8] [--rounds 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+MODEL_PATH = os.getenv("MODEL_PATH", "/models/bert")
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "ner_corpus.txt")
+
+
+def rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def measure(backend: str, rounds: int) -> dict:
+    baseline = rss_mb()
+    start = time.perf_counter()
+    from transformers import AutoTokenizer
+    from backends import load_backend
+    from inference import NERPipeline
+
+    pipeline = NERPipeline(AutoTokenizer.from_pretrained(MODEL_PATH), load_backend(MODEL_PATH, backend))
+    startup = time.perf_counter() - start
+
+    with open(CORPUS, encoding="utf-8") as f:
+        texts = [line.strip() for line in f if line.strip()]
+    pipeline.predict(texts[:2])  # warm-up
+
+    latencies = []
+    for _ in range(rounds):
+        for text in texts:
+            t0 = time.perf_counter()
+            pipeline.predict([text])
+            latencies.append(time.perf_counter() - t0)
+    latencies.sort()
+
+    return {
+        "startup_s": startup,
+        "memory_mb": rss_mb() - baseline,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backends", default="torch,onnx,onnx-int8")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(measure(args.worker, args.rounds)))
+        return
+
+    backends = args.backends.split(",")
+    # Export / quantize once up front so startup times reflect a warm deployment
+    for backend in backends:
+        subprocess.run(
+            [sys.executable, "-c", f"from backends import load_backend; load_backend({MODEL_PATH!r}, {backend!r})"],
+            check=True, capture_output=True, cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+
+    print(f"{'backend':<10} {'startup':>9} {'memory':>10} {'p50':>8} {'p95':>8}")
+    for backend in backends:
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--worker", backend, "--rounds", str(args.rounds)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(
+            f"{backend:<10} {result['startup_s']:8.2f}s {result['memory_mb']:8.0f}MB "
+            f"{result['p50_ms']:6.1f}ms {result['p95_ms']:6.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
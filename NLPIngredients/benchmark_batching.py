@@ -0,0 +1,88 @@
+"""
+Throughput / latency of NER inference under concurrent load, one request per
+forward pass versus dynamic micro-batching.
+
+Usage: MODEL_PATH=/models/bert python benchmark_batching.py [--requests 400] [--concurrency 1,4,16,32]
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from transformers import AutoTokenizer
+
+from backends import load_backend
+from inference import NERPipeline, MicroBatcher
+
+MODEL_PATH = os.getenv("MODEL_PATH", "/models/bert")
+
+INGREDIENTS = [
+    "farine de blé", "sucre", "huile de palme", "noisettes 13%", "cacao maigre", "lait écrémé en poudre",
+    "lactosérum", "émulsifiant lécithine de soja", "vanilline", "sel", "eau", "beurre", "œufs frais",
+    "amidon de maïs", "sirop de glucose", "arômes naturels", "levure", "huile de tournesol",
+]
+
+
+def synthetic_text(rng: random.Random) -> str:
+    ingredients = ", ".join(rng.sample(INGREDIENTS, rng.randint(3, len(INGREDIENTS))))
+    return f"Biscuit chocolat {rng.choice([125, 250, 400, 500])}g. Ingrédients: {ingredients}."
+
+
+def run_load(call, texts, concurrency):
+    latencies = []
+
+    def one(text):
+        start = time.perf_counter()
+        call(text)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, texts))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "throughput": len(texts) / elapsed,
+        "p50": statistics.median(latencies) * 1000,
+        "p95": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", default="1,4,16,32")
+    parser.add_argument("--max-batch-size", type=int, default=16)
+    parser.add_argument("--max-wait-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_PATH)
+    pipeline = NERPipeline(tokenizer, load_backend(MODEL_PATH))
+
+    rng = random.Random(0)
+    texts = [synthetic_text(rng) for _ in range(args.requests)]
+    pipeline.extract(texts[:8])  # warm-up
+
+    modes = {
+        "unbatched": MicroBatcher(pipeline.extract, max_batch_size=1, max_wait_ms=0),
+        "micro-batched": MicroBatcher(pipeline.extract, args.max_batch_size, args.max_wait_ms),
+    }
+
+    print(f"{args.requests} requests, max batch {args.max_batch_size}, max wait {args.max_wait_ms:g}ms")
+    print(f"{'mode':<14} {'concurrency':>11} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'avg batch':>10}")
+    for name, batcher in modes.items():
+        for concurrency in [int(c) for c in args.concurrency.split(",")]:
+            batcher.counters.update(requests=0, batches=0)
+            result = run_load(batcher, texts, concurrency)
+            print(
+                f"{name:<14} {concurrency:>11} {result['throughput']:8.1f} {result['p50']:8.1f} "
+                f"{result['p95']:8.1f} {batcher.stats()['avg_batch_size']:>10}"
+            )
+        batcher.stop()
+
+
+if __name__ == "__main__":
+    main()
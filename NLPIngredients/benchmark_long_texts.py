@@ -0,0 +1,74 @@
+"""
+Latency of sliding-window inference as ingredient lists grow, with all windows
+in one batched forward pass versus one pass per window, and how much of the
+text plain truncation would have kept.
+
+Usage: MODEL_PATH=/models/bert python benchmark_long_texts.py [--sizes 10,50,100,200,400] [--rounds 5]
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+
+from transformers import AutoTokenizer
+
+from backends import load_backend
+from benchmark_batching import INGREDIENTS
+from inference import NERPipeline
+
+MODEL_PATH = os.getenv("MODEL_PATH", "/models/bert")
+
+
+def long_text(rng: random.Random, count: int) -> str:
+    ingredients = ", ".join(rng.choice(INGREDIENTS) for _ in range(count))
+    return f"Plat cuisiné 450g. Ingrédients: {ingredients}."
+
+
+def timed(fn, rounds: int) -> float:
+    fn()  # warm-up
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10,50,100,200,400")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_PATH)
+    runner = load_backend(MODEL_PATH)
+    batched = NERPipeline(tokenizer, runner)
+    sequential = NERPipeline(tokenizer, runner, forward_batch_size=1)
+
+    rng = random.Random(0)
+    print(f"max_length {batched.max_length}, stride {batched.stride}")
+    print(
+        f"{'ingredients':>11} {'tokens':>7} {'windows':>8} {'truncated kept':>15} "
+        f"{'batched':>9} {'per window':>11} {'ms/1k tok':>10}"
+    )
+    for size in [int(s) for s in args.sizes.split(",")]:
+        text = long_text(rng, size)
+        tokens = len(tokenizer(text)["input_ids"])
+        first = tokenizer(text, truncation=True, max_length=batched.max_length, return_offsets_mapping=True)
+        kept = max(end for _, end in first["offset_mapping"]) / len(text)
+        windows = len(tokenizer(
+            text, truncation=True, max_length=batched.max_length, stride=batched.stride,
+            return_overflowing_tokens=True
+        )["input_ids"])
+
+        batched_ms = timed(lambda: batched.predict([text]), args.rounds)
+        sequential_ms = timed(lambda: sequential.predict([text]), args.rounds)
+        print(
+            f"{size:>11} {tokens:>7} {windows:>8} {kept:>14.0%} "
+            f"{batched_ms:8.1f}ms {sequential_ms:9.1f}ms {batched_ms / tokens * 1000:10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Throughput and memory of the pre-forked server (serve.py) as workers are added.
+
+Each configuration starts a fresh server (Consul registration disabled, SQLite
+database) and sends unique texts to /extract from --concurrency client
+threads. Memory is the total PSS of master + workers, so pages shared
+copy-on-write are only counted once.
+
+Usage: MODEL_PATH=/models/bert python benchmark_workers.py [--workers 1,2,4] [--requests 400] [--concurrency 16]
+"""
+import argparse
+import os
+import random
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmark_batching import synthetic_text
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+LAUNCHER = (
+    "import main; main.register_service = lambda *args, **kwargs: None; "
+    "import serve; serve.main()"
+)
+
+
+def pss_mb(pid: int) -> float:
+    pids = [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            pids += [int(p) for p in f.read().split()]
+    except OSError:
+        pass
+    total = 0
+    for p in pids:
+        try:
+            with open(f"/proc/{p}/smaps_rollup") as f:
+                for line in f:
+                    if line.startswith("Pss:"):
+                        total += int(line.split()[1])
+        except OSError:
+            pass
+    return total / 1024
+
+
+def wait_ready(url: str, process, timeout: float = 120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("Server exited during startup")
+        try:
+            if requests.get(f"{url}/health", timeout=1).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError("Server did not become ready")
+
+
+def run_load(url: str, texts, concurrency: int):
+    local = threading.local()
+    latencies = []
+
+    def one(text):
+        session = getattr(local, "session", None) or requests.Session()
+        local.session = session
+        start = time.perf_counter()
+        session.post(f"{url}/extract", json={"text": text}).raise_for_status()
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, texts))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return len(texts) / elapsed, statistics.median(latencies) * 1000, latencies[int(len(latencies) * 0.95) - 1] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--port", type=int, default=18002)
+    args = parser.parse_args()
+
+    url = f"http://127.0.0.1:{args.port}"
+    print(f"{'workers':>7} {'torch thr.':>10} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'PSS MB':>8}")
+    for workers in [int(w) for w in args.workers.split(",")]:
+        rng = random.Random(workers)
+        # Unique texts so the NER cache never answers
+        texts = [f"{synthetic_text(rng)} Lot {i}." for i in range(args.requests)]
+        threads = max(1, (os.cpu_count() or 1) // workers)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            env = {
+                **os.environ,
+                "NLP_WORKERS": str(workers),
+                "NLP_TORCH_THREADS": str(threads),
+                "PORT": str(args.port),
+                "HOST": "127.0.0.1",
+                "DATABASE_URL": f"sqlite:///{tmp}/nlp.db",
+            }
+            process = subprocess.Popen(
+                [sys.executable, "-c", LAUNCHER], cwd=HERE, env=env,
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+            try:
+                wait_ready(url, process)
+                run_load(url, texts[:args.concurrency], args.concurrency)  # warm-up
+                throughput, p50, p95 = run_load(url, texts, args.concurrency)
+                memory = pss_mb(process.pid)
+            finally:
+                process.send_signal(signal.SIGTERM)
+                process.wait(30)
+
+        print(f"{workers:>7} {threads:>10} {throughput:8.1f} {p50:8.1f} {p95:8.1f} {memory:8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Entity-level parity of the ONNX backends against the PyTorch reference on a
+fixture corpus (one text per line). Exits with status 1 when a backend's
+entity F1 falls below --min-f1.
+
+Usage: MODEL_PATH=/models/bert python check_backend_parity.py [--corpus fixtures/ner_corpus.txt] [--min-f1 0.98]
+"""
+import argparse
+import os
+import sys
+
+from transformers import AutoTokenizer
+
+from backends import load_backend
+from inference import NERPipeline
+
+MODEL_PATH = os.getenv("MODEL_PATH", "/models/bert")
+
+
+def entity_set(entities):
+    return {(e["label"], e["start"], e["end"]) for e in entities}
+
+
+def compare(reference, candidate):
+    true_positives = predicted = expected = exact = 0
+    for ref, cand in zip(reference, candidate):
+        ref, cand = entity_set(ref), entity_set(cand)
+        true_positives += len(ref & cand)
+        predicted += len(cand)
+        expected += len(ref)
+        exact += ref == cand
+    precision = true_positives / predicted if predicted else 1.0
+    recall = true_positives / expected if expected else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {"exact": exact / len(reference), "precision": precision, "recall": recall, "f1": f1}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", default=os.path.join(os.path.dirname(__file__), "fixtures", "ner_corpus.txt"))
+    parser.add_argument("--backends", default="onnx,onnx-int8")
+    parser.add_argument("--min-f1", type=float, default=0.98)
+    args = parser.parse_args()
+
+    with open(args.corpus, encoding="utf-8") as f:
+        texts = [line.strip() for line in f if line.strip()]
+
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_PATH)
+    reference = NERPipeline(tokenizer, load_backend(MODEL_PATH, "torch")).predict(texts)
+
+    failed = False
+    print(f"{len(texts)} texts, {sum(len(r) for r in reference)} reference entities")
+    print(f"{'backend':<10} {'exact':>7} {'precision':>10} {'recall':>8} {'f1':>7}")
+    for name in args.backends.split(","):
+        candidate = NERPipeline(tokenizer, load_backend(MODEL_PATH, name)).predict(texts)
+        result = compare(reference, candidate)
+        status = "ok" if result["f1"] >= args.min_f1 else "FAIL"
+        failed |= status == "FAIL"
+        print(
+            f"{name:<10} {result['exact']:7.3f} {result['precision']:10.3f} "
+            f"{result['recall']:8.3f} {result['f1']:7.3f}  {status}"
+        )
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
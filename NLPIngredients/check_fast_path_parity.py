@@ -0,0 +1,103 @@
+"""
+Parity of the rule-based fast path (fast_path.py) on a labelled corpus: one
+JSON object per line with the text and the expected extraction, or null when
+the text must fall back to the model. Exits with status 1 when an accepted
+text differs from its expectation or a fallback text is accepted.
+
+With --model, the texts the fast path accepts are also run through BERT and
+the ingredient agreement between both paths is reported.
+
+Usage: python check_fast_path_parity.py [--corpus fixtures/fast_path_corpus.jsonl] [--model]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from fast_path import MIN_CONFIDENCE, parse
+
+MODEL_PATH = os.getenv("MODEL_PATH", "/models/bert")
+
+
+def normalize(ingredients):
+    return {i.lower() for i in ingredients or []}
+
+
+def ingredient_f1(reference, candidate):
+    true_positives = predicted = expected = 0
+    for ref, cand in zip(reference, candidate):
+        ref, cand = normalize(ref), normalize(cand)
+        true_positives += len(ref & cand)
+        predicted += len(cand)
+        expected += len(ref)
+    precision = true_positives / predicted if predicted else 1.0
+    recall = true_positives / expected if expected else 1.0
+    return 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+
+
+def model_agreement(texts, extractions):
+    from transformers import AutoTokenizer
+
+    from backends import load_backend
+    from inference import NERPipeline
+
+    pipeline = NERPipeline(AutoTokenizer.from_pretrained(MODEL_PATH), load_backend(MODEL_PATH))
+    start = time.perf_counter()
+    predicted = pipeline.extract(texts)
+    elapsed = (time.perf_counter() - start) * 1000
+    f1 = ingredient_f1([p["ingredients"] for p in predicted], [e["ingredients"] for e in extractions])
+    return f1, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", default=os.path.join(os.path.dirname(__file__), "fixtures", "fast_path_corpus.jsonl"))
+    parser.add_argument("--min-confidence", type=float, default=MIN_CONFIDENCE)
+    parser.add_argument("--model", action="store_true", help="compare accepted texts with the model path")
+    args = parser.parse_args()
+
+    with open(args.corpus, encoding="utf-8") as f:
+        cases = [json.loads(line) for line in f if line.strip()]
+
+    start = time.perf_counter()
+    parsed = [parse(case["text"]) for case in cases]
+    elapsed = (time.perf_counter() - start) * 1000
+
+    accepted_texts, accepted, expected = [], [], []
+    false_accepts = false_rejects = mismatches = 0
+    for case, (extraction, confidence) in zip(cases, parsed):
+        is_accepted = extraction is not None and confidence >= args.min_confidence
+        if case["expected"] is None:
+            if is_accepted:
+                false_accepts += 1
+                print(f"FALSE ACCEPT ({confidence}): {case['text'][:80]}")
+            continue
+        if not is_accepted:
+            false_rejects += 1
+            print(f"fallback ({confidence}): {case['text'][:80]}")
+            continue
+        if extraction != case["expected"]:
+            mismatches += 1
+            print(f"MISMATCH: {case['text'][:80]}\n  expected {case['expected']}\n  got      {extraction}")
+        accepted_texts.append(case["text"])
+        accepted.append(extraction)
+        expected.append(case["expected"])
+
+    structured = sum(case["expected"] is not None for case in cases)
+    print(f"{len(cases)} texts ({structured} structured), parsed in {elapsed:.1f}ms")
+    print(f"fast path ratio   {len(accepted) / len(cases):.3f}")
+    print(f"false accepts     {false_accepts}")
+    print(f"fallbacks         {false_rejects} of {structured} structured")
+    print(f"exact match       {(len(accepted) - mismatches) / len(accepted) if accepted else 0:.3f}")
+    print(f"ingredient f1     {ingredient_f1([e['ingredients'] for e in expected], [a['ingredients'] for a in accepted]):.3f}")
+
+    if args.model and accepted:
+        f1, model_ms = model_agreement(accepted_texts, accepted)
+        print(f"model agreement   f1 {f1:.3f} (model path {model_ms:.1f}ms for the same texts)")
+
+    sys.exit(1 if false_accepts or mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -11,4 +11,7 @@ class NERExtraction(Base):
     product_name = Column(String, nullable=True)
     weight = Column(String, nullable=True)
     ingredients = Column(JSON, nullable=False)
+    # sha256 of the normalized text, used as cache key together with model_version
+    text_hash = Column(String(64), nullable=True, index=True)
+    model_version = Column(String(64), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
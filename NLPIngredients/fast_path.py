@@ -0,0 +1,179 @@
+"""
+Rule-based parser for already structured ingredient texts, e.g. the
+"Name 250g. composition" strings built by the Gateway and the mobile app from
+Open Food Facts `ingredients_text`. Texts it parses with enough confidence skip
+the model entirely; anything else falls back to BERT.
+"""
+import os
+import re
+from typing import List, Optional, Tuple
+
+FAST_PATH_ENABLED = os.getenv("NLP_FAST_PATH", "true").lower() == "true"
+MIN_CONFIDENCE = float(os.getenv("NLP_FAST_PATH_MIN_CONFIDENCE", "0.8"))
+
+WEIGHT = r"(?:\d+\s?x\s?)?\d+(?:[.,]\d+)?\s?(?:kg|g|mg|cl|ml|l)\b"
+MULTIPACK = re.compile(r"^(\d+)\s?x\s?(\d+(?:[.,]\d+)?)\s?([a-z]+)$", re.IGNORECASE)
+# "Pâte à tartiner 400g. Sucre, huile..." -> name, weight, composition
+HEADER = re.compile(rf"^(?P<name>.*?)\s*(?P<weight>{WEIGHT})\s*\.?\s+(?P<body>.+)$", re.IGNORECASE)
+INGREDIENTS_PREFIX = re.compile(r"^.{0,80}?\b(?:ingr[ée]dients?|composition)\s*:?\s*", re.IGNORECASE)
+# Allergen / precautionary statements that end the ingredient list
+TRAILER = re.compile(
+    r"\b(?:peut contenir|traces? (?:[ée]ventuelles? )?de|may contain|contient naturellement|"
+    r"pr[ée]par[ée]e? avec|fabriqu[ée] dans|dont sucres?)\b.*$",
+    re.IGNORECASE,
+)
+# Allergen markup used by Open Food Facts: _lait_, <span class="allergen">lait</span>, **lait**
+ALLERGEN_MARKUP = re.compile(r"<span[^>]*>(.*?)</span>|_([^_]+)_|\*\*([^*]+)\*\*")
+# "13%", "7,4 %", "148g pour 100g (de produit)"
+PERCENT = re.compile(
+    r"[<>≤]?\s*\d+(?:[.,]\d+)?\s?%|\d+(?:[.,]\d+)?\s?g pour 100\s?g(?: de [\w ]+)?",
+    re.IGNORECASE,
+)
+# "émulsifiant : lécithines de soja" -> the additive class is dropped
+ADDITIVE_CLASS = re.compile(
+    r"^(?:[ée]mulsifiants?|acidifiants?|antioxydants?|conservateurs?|colorants?|[ée]paississants?|"
+    r"g[ée]lifiants?|stabilisants?|correcteurs? d'acidit[ée]|affermissants?|agents? de [\w ]+|"
+    r"poudres? [àa] lever|exhausteurs? de go[ûu]t|[ée]dulcorants?|antiagglom[ée]rants?|"
+    r"emulsifiers?|acidity regulators?|antioxidants?|preservatives?|colou?rs?|thickeners?|stabili[sz]ers?)"
+    r"\s*:\s*",
+    re.IGNORECASE,
+)
+E_NUMBER = re.compile(r"\bE\s?\d{3,4}[a-z]?\b", re.IGNORECASE)
+OPENERS, CLOSERS = "([{", ")]}"
+
+
+def normalize_weight(weight: str) -> str:
+    """'4 x 125 g' -> '500g' (total weight, as the LCA service expects)"""
+    weight = re.sub(r"\s+", "", weight)
+    multipack = MULTIPACK.match(weight)
+    if multipack:
+        count, unit_weight, unit = multipack.groups()
+        return f"{int(count) * float(unit_weight.replace(',', '.')):g}{unit}"
+    return weight
+
+
+def strip_markup(text: str) -> str:
+    return ALLERGEN_MARKUP.sub(lambda m: next(g for g in m.groups() if g is not None), text)
+
+
+def split_top_level(text: str) -> Tuple[List[str], bool]:
+    """Split on , and ; outside brackets; also reports whether brackets balance"""
+    items, depth, current = [], 0, []
+    balanced = True
+    for i, char in enumerate(text):
+        if char in OPENERS:
+            depth += 1
+        elif char in CLOSERS:
+            depth -= 1
+            if depth < 0:
+                balanced, depth = False, 0
+        # "7,4%" is a decimal comma, not a separator
+        decimal = char == "," and 0 < i < len(text) - 1 and text[i - 1].isdigit() and text[i + 1].isdigit()
+        if char in ",;" and depth == 0 and not decimal:
+            items.append("".join(current))
+            current = []
+        else:
+            current.append(char)
+    items.append("".join(current))
+    return items, balanced and depth == 0
+
+
+def remove_brackets(text: str) -> str:
+    """Drop bracketed sub-lists (nested included): 'préparation (fraises, sucre)' -> 'préparation'"""
+    result, depth = [], 0
+    for char in text:
+        if char in OPENERS:
+            depth += 1
+        elif char in CLOSERS:
+            depth = max(0, depth - 1)
+        elif depth == 0:
+            result.append(char)
+    return "".join(result)
+
+
+def clean_ingredient(item: str) -> str:
+    item = ADDITIVE_CLASS.sub("", item.strip())
+    item = PERCENT.sub("", remove_brackets(item))
+    item = re.sub(r"\s+", " ", item)
+    return item.strip(" .:-*")
+
+
+def looks_like_ingredient(item: str) -> bool:
+    if not 2 <= len(item) <= 60 or len(item.split()) > 7:
+        return False
+    # E-numbers (E322) are fine, other digits suggest OCR noise or prose
+    rest = E_NUMBER.sub("", item).replace(" ", "")
+    if not rest:
+        return True
+    letters = sum(c.isalpha() for c in rest)
+    digits = sum(c.isdigit() for c in rest)
+    return letters >= 0.7 * len(rest) and digits == 0
+
+
+def parse(text: str) -> Tuple[Optional[dict], float]:
+    """Return (extraction, confidence); extraction has the same shape as the model path"""
+    text = re.sub(r"\s+", " ", strip_markup(text)).strip()
+    product = weight = None
+    body = text
+
+    header = HEADER.match(text)
+    if header and header.group("name").strip():
+        product = header.group("name").strip(" .,:")
+        weight = normalize_weight(header.group("weight"))
+        body = header.group("body")
+
+    body = INGREDIENTS_PREFIX.sub("", body, count=1)
+    body = TRAILER.sub("", body).strip().rstrip(".")
+    if not body:
+        return None, 0.0
+
+    raw_items, balanced = split_top_level(body)
+    raw_items = [item for item in raw_items if item.strip()]
+    ingredients = [clean_ingredient(item) for item in raw_items]
+    ingredients = [item for item in ingredients if item]
+    if not ingredients:
+        return None, 0.0
+
+    confidence = sum(looks_like_ingredient(item) for item in ingredients) / len(raw_items)
+    if not balanced:
+        confidence *= 0.5
+    if len(ingredients) < 2:
+        confidence *= 0.85
+    if product is None:
+        # Without the "Name 250g." header the name and weight are left to the model
+        confidence *= 0.7
+
+    extraction = {
+        "product_name": product,
+        "weight": weight,
+        "ingredients": list(dict.fromkeys(ingredients))
+    }
+    return extraction, round(confidence, 3)
+
+
+class FastPath:
+    """Rule-based extraction with model fallback bookkeeping"""
+
+    def __init__(self, enabled: bool = FAST_PATH_ENABLED, min_confidence: float = MIN_CONFIDENCE):
+        self.enabled = enabled
+        self.min_confidence = min_confidence
+        self.counters = {"fast_path": 0, "model_path": 0}
+
+    def try_parse(self, text: str) -> Optional[dict]:
+        """Extraction when the rules are confident enough, otherwise None (use the model)"""
+        if self.enabled:
+            extraction, confidence = parse(text)
+            if extraction is not None and confidence >= self.min_confidence:
+                self.counters["fast_path"] += 1
+                return extraction
+        self.counters["model_path"] += 1
+        return None
+
+    def stats(self) -> dict:
+        total = self.counters["fast_path"] + self.counters["model_path"]
+        return {
+            **self.counters,
+            "enabled": self.enabled,
+            "min_confidence": self.min_confidence,
+            "fast_path_ratio": round(self.counters["fast_path"] / total, 3) if total else 0.0,
+        }
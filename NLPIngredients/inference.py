@@ -0,0 +1,308 @@
+import os
+import queue
+import re
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+import metrics
+
+MAX_BATCH_SIZE = int(os.getenv("NLP_MAX_BATCH_SIZE", "16"))
+MAX_WAIT_MS = float(os.getenv("NLP_MAX_WAIT_MS", "5"))
+# Upper token-length bound of each padding bucket; longer inputs share the last one
+LENGTH_BUCKETS = [int(b) for b in os.getenv("NLP_LENGTH_BUCKETS", "32,64,128,256,512").split(",")]
+# Rows per forward pass when a bucket holds more texts (bulk /extract/batch calls)
+FORWARD_BATCH_SIZE = int(os.getenv("NLP_FORWARD_BATCH_SIZE", "64"))
+# Long texts are split into windows of NLP_MAX_LENGTH tokens overlapping by
+# NLP_WINDOW_STRIDE tokens (defaults: model limit capped at 512, a quarter of it)
+MAX_LENGTH = int(os.getenv("NLP_MAX_LENGTH", "0"))
+WINDOW_STRIDE = int(os.getenv("NLP_WINDOW_STRIDE", "0"))
+
+
+def decode_entities(preds: List[int], offsets: List[List[int]], id2label: Dict[int, str]) -> List[dict]:
+    """Turn BIO token predictions into character spans"""
+    entities = []
+    current = None
+
+    for pred_id, (start, end) in zip(preds, offsets):
+        if start == end == 0:
+            continue
+
+        label = id2label[pred_id]
+
+        if label == "O":
+            if current:
+                entities.append(current)
+                current = None
+            continue
+
+        prefix, ent_type = label.split("-")
+
+        if prefix == "B":
+            if current:
+                entities.append(current)
+            current = {"label": ent_type, "start": start, "end": end}
+
+        elif prefix == "I" and current and current["label"] == ent_type:
+            current["end"] = end
+
+        else:
+            if current:
+                entities.append(current)
+            current = None
+
+    if current:
+        entities.append(current)
+
+    return entities
+
+
+def build_extraction(text: str, entities: List[dict]) -> dict:
+    """Map entity spans to product name, weight and a deduplicated ingredient list"""
+    product = None
+    weight = None
+    ingredients = []
+
+    for ent in entities:
+        span = text[ent["start"]:ent["end"]].strip()
+
+        if ent["label"] == "PRODUCT":
+            product = span
+
+        elif ent["label"] == "WEIGHT":
+            weight = span
+
+        elif ent["label"] == "ING":
+            # Split merged ingredients
+            parts = re.split(r"[;,]+", span)
+            for p in parts:
+                p = p.strip()
+                if len(p) > 1:
+                    ingredients.append(p)
+
+    # Remove duplicates
+    ingredients = list(dict.fromkeys(ingredients))
+
+    return {
+        "product_name": product,
+        "weight": weight,
+        "ingredients": ingredients
+    }
+
+
+def merge_windows(windows: List[tuple]) -> tuple:
+    """
+    Merge the (preds, offsets) of overlapping windows of one text into a single
+    token sequence. A token seen in several windows keeps the prediction made
+    with the most context, i.e. furthest from a window edge.
+    """
+    best: Dict[tuple, tuple] = {}
+    for preds, offsets in windows:
+        positions = [i for i, (start, end) in enumerate(offsets) if not start == end == 0]
+        for rank, i in enumerate(positions):
+            span = tuple(offsets[i])
+            context = min(rank, len(positions) - 1 - rank)
+            if span not in best or context > best[span][1]:
+                best[span] = (preds[i], context)
+    spans = sorted(best)
+    return [best[span][0] for span in spans], spans
+
+
+def bucket_by_length(lengths: List[int], buckets: List[int] = LENGTH_BUCKETS) -> List[List[int]]:
+    """Group item indexes by token-length bucket, shortest first, to limit padding"""
+    groups: Dict[int, List[int]] = {}
+    for index, length in enumerate(lengths):
+        bound = next((b for b in buckets if length <= b), buckets[-1])
+        groups.setdefault(bound, []).append(index)
+    return [sorted(groups[bound], key=lambda i: lengths[i]) for bound in sorted(groups)]
+
+
+class NERPipeline:
+    """Tokenizer + inference backend (see backends.py) running padded batches"""
+
+    def __init__(self, tokenizer, runner, forward_batch_size: int = FORWARD_BATCH_SIZE):
+        self.tokenizer = tokenizer
+        self.runner = runner
+        self.forward_batch_size = forward_batch_size
+        self.id2label = runner.config.id2label
+        self.pad_token_id = tokenizer.pad_token_id or 0
+        # Some tokenizers report a huge sentinel as model_max_length
+        self.max_length = MAX_LENGTH or min(tokenizer.model_max_length, 512)
+        self.stride = WINDOW_STRIDE or self.max_length // 4
+
+    def _forward(self, input_ids: List[List[int]]) -> List[List[int]]:
+        width = max(len(ids) for ids in input_ids)
+        padded = np.full((len(input_ids), width), self.pad_token_id, dtype=np.int64)
+        mask = np.zeros((len(input_ids), width), dtype=np.int64)
+        for row, ids in enumerate(input_ids):
+            padded[row, :len(ids)] = ids
+            mask[row, :len(ids)] = 1
+
+        metrics.FORWARD_BATCH_SIZE.observe(len(input_ids))
+        with metrics.stage("forward"):
+            preds = self.runner(padded, mask).argmax(axis=-1).tolist()
+        return [p[:len(ids)] for p, ids in zip(preds, input_ids)]
+
+    def predict(self, texts: List[str]) -> List[List[dict]]:
+        """
+        Entities for every text. One tokenizer call splits long texts into
+        overlapping windows; all windows are run together, in padded forward
+        passes per length bucket, then merged back per text.
+        """
+        with metrics.stage("tokenize"):
+            encoded = self.tokenizer(
+                texts,
+                return_offsets_mapping=True,
+                truncation=True,
+                max_length=self.max_length,
+                stride=self.stride,
+                return_overflowing_tokens=True
+            )
+        input_ids = encoded["input_ids"]
+        offsets = encoded["offset_mapping"]
+        owners = encoded["overflow_to_sample_mapping"]
+
+        window_preds: List[Optional[List[int]]] = [None] * len(input_ids)
+        for bucket in bucket_by_length([len(ids) for ids in input_ids]):
+            for pos in range(0, len(bucket), self.forward_batch_size):
+                group = bucket[pos:pos + self.forward_batch_size]
+                for i, pred in zip(group, self._forward([input_ids[i] for i in group])):
+                    window_preds[i] = pred
+
+        with metrics.stage("decode"):
+            windows: List[List[tuple]] = [[] for _ in texts]
+            for i, owner in enumerate(owners):
+                windows[owner].append((window_preds[i], offsets[i]))
+
+            results = []
+            for text_windows in windows:
+                if len(text_windows) > 1:
+                    preds, spans = merge_windows(text_windows)
+                else:
+                    preds, spans = text_windows[0]
+                results.append(decode_entities(preds, spans, self.id2label))
+        return results
+
+    def extract(self, texts: List[str]) -> List[dict]:
+        return [build_extraction(t, e) for t, e in zip(texts, self.predict(texts))]
+
+
+class MicroBatcher:
+    """
+    Collects concurrent requests into batches: a batch closes when it reaches
+    max_batch_size or max_wait_ms after its first request, then runs in a
+    single call to `handler` on the worker thread.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[List[str]], List[dict]],
+        max_batch_size: int = MAX_BATCH_SIZE,
+        max_wait_ms: float = MAX_WAIT_MS,
+    ):
+        self.handler = handler
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue: "queue.Queue" = queue.Queue()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self.counters = {"requests": 0, "batches": 0, "errors": 0}
+
+    def _ensure_started(self):
+        # Started on first use, once per process: threads do not survive a fork (see serve.py)
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._thread = threading.Thread(target=self._run, name="ner-batcher", daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def submit(self, text: str) -> Future:
+        if self._stopped.is_set():
+            raise RuntimeError("Batcher is stopped")
+        self._ensure_started()
+        future: Future = Future()
+        self._queue.put((text, future, time.perf_counter()))
+        metrics.QUEUE_DEPTH.set(self._queue.qsize())
+        return future
+
+    def __call__(self, text: str) -> dict:
+        future = self.submit(text)
+        result = future.result()
+        # Stages run on the worker thread are reported as part of this request
+        metrics.add_timings(future.timings)
+        return result
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        if batch[0] is None:
+            return []
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._stopped.set()
+                break
+            batch.append(item)
+        metrics.QUEUE_DEPTH.set(self._queue.qsize())
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch:
+                self._process(batch)
+            if self._stopped.is_set() and self._queue.empty():
+                return
+
+    def _process(self, batch: list):
+        texts = [text for text, _, _ in batch]
+        self.counters["requests"] += len(batch)
+        self.counters["batches"] += 1
+        metrics.MICRO_BATCH_SIZE.observe(len(batch))
+        started = time.perf_counter()
+        timings = metrics.start_timings()
+        try:
+            results = self.handler(texts)
+        except Exception as e:
+            self.counters["errors"] += 1
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        for (_, future, submitted), result in zip(batch, results):
+            waited = started - submitted
+            metrics.STAGE_SECONDS.observe(waited, "queue_wait")
+            future.timings = {"queue_wait": waited, **timings}
+            future.set_result(result)
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> dict:
+        batches = self.counters["batches"]
+        return {
+            **self.counters,
+            "queue_depth": self.queue_depth(),
+            "avg_batch_size": round(self.counters["requests"] / batches, 2) if batches else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+        }
+
+    def stop(self, timeout: float = 10):
+        """Finish queued requests, then stop the worker thread"""
+        self._stopped.set()
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
@@ -1,37 +1,61 @@
-from service_discovery import discover
-from fastapi import FastAPI, Depends
+from ecolabel_common.service_discovery import registry
+from fastapi import FastAPI, Depends, HTTPException, Request
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
-from transformers import AutoTokenizer, AutoModelForTokenClassification
-import torch
-import re
+from typing import List
+from transformers import AutoTokenizer
 import requests
 import socket
+import time
 import os
 
 from sqlalchemy.orm import Session
 from database.connection import get_db, Base, engine
 from database.models import NERExtraction
+from inference import NERPipeline, MicroBatcher
+from backends import load_backend, NLP_BACKEND
+from ner_cache import NERCache, ensure_cache_columns, model_version, text_hash
+from ecolabel_common.write_behind import WriteBehindQueue, WriteQueueFull
+from fast_path import FastPath
+import metrics
 
 # MODEL_PATH = "bert_ms2_ner_model"
 MODEL_PATH = os.getenv("MODEL_PATH", "/models/bert")
+MAX_BATCH_TEXTS = int(os.getenv("NLP_MAX_BATCH_TEXTS", "1000"))  # capped below at the write queue size
+# Per-stage durations in a Server-Timing response header (visible to the Gateway and browsers)
+SERVER_TIMING = os.getenv("NLP_SERVER_TIMING", "true").lower() == "true"
 
 # Create tables
 Base.metadata.create_all(bind=engine)
+ensure_cache_columns(engine)
 
-# Load tokenizer and model
+# Load tokenizer and model (inference backend selected by NLP_BACKEND)
 tokenizer = AutoTokenizer.from_pretrained(MODEL_PATH)
-model = AutoModelForTokenClassification.from_pretrained(MODEL_PATH)
+model = load_backend(MODEL_PATH)
 id2label = model.config.id2label
+pipeline = NERPipeline(tokenizer, model)
+batcher = MicroBatcher(pipeline.extract)
+# Repeat texts are answered from the cache; a new model version starts cold
+ner_cache = NERCache(model_version(MODEL_PATH, NLP_BACKEND))
+# Clean comma-separated compositions are parsed by rules, the rest by the model
+fast_path = FastPath()
+# Extractions are archived in the background, in bulk
+extraction_writer = WriteBehindQueue(engine, NERExtraction)
+# A batch is archived all at once, so it can never be larger than the write queue
+MAX_BATCH_TEXTS = min(MAX_BATCH_TEXTS, extraction_writer.max_queue)
 
 CONSUL_URL = "http://consul:8500/v1/agent/service/register"
 
 def register_service(name: str, service_name: str, port: int):
+    address = socket.gethostbyname(socket.gethostname())
+    # One ID per replica so scaled-out instances do not overwrite each other
     payload = {
+        "ID": f"{service_name}-{socket.gethostname()}",
         "Name": name,
-        "Address": socket.gethostbyname(socket.gethostname()),
+        "Address": address,
         "Port": port,
         "Check": {
-            "HTTP": f"http://{service_name}:{port}/health",
+            "HTTP": f"http://{address}:{port}/health",
             "Interval": "10s"
         }
     }
@@ -43,13 +67,58 @@ app = FastAPI(title="EcoLabel-MS2 NLP API")
 class NLPInput(BaseModel):
     text: str
 
+
+class NLPBatchInput(BaseModel):
+    texts: List[str]
+
+@app.middleware("http")
+async def timing_middleware(request: Request, call_next):
+    timings = metrics.start_timings()
+    start = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - start
+
+    endpoint = request.url.path if request.url.path in metrics.ENDPOINTS else "other"
+    metrics.REQUEST_SECONDS.observe(elapsed, endpoint)
+    metrics.REQUESTS.inc(endpoint, f"{response.status_code // 100}xx")
+    if SERVER_TIMING and timings:
+        response.headers["Server-Timing"] = metrics.server_timing({**timings, "total": elapsed})
+    return response
+
 @app.on_event("startup")
 def startup():
     register_service("NLP-INGREDIENTS", "nlp-ingredients", 8002)
+
+@app.on_event("shutdown")
+def shutdown():
+    batcher.stop()
+    extraction_writer.stop()
+
+@app.get("/debug/batching")
+def debug_batching():
+    return batcher.stats()
+
+@app.get("/debug/cache")
+def debug_cache():
+    return ner_cache.stats()
+
+@app.get("/debug/fast-path")
+def debug_fast_path():
+    return fast_path.stats()
+
+@app.get("/debug/write-behind")
+def debug_write_behind():
+    return extraction_writer.stats()
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/debug/model")
 def debug_model():
     return {
         "model_path": MODEL_PATH,
+        "backend": model.name,
         "model_loaded": model is not None,
         "num_labels": model.config.num_labels,
         "labels": model.config.id2label
@@ -59,97 +128,100 @@ def debug_model():
 def extract_entities(input: NLPInput, db: Session = Depends(get_db)):
 
     text = input.text
-
-    # Tokenization
-    encoded = tokenizer(
-        text,
-        return_tensors="pt",
-        return_offsets_mapping=True,
-        truncation=True
-    )
-
-    with torch.no_grad():
-        outputs = model(**{k: v for k, v in encoded.items() if k != "offset_mapping"})
-
-    preds = torch.argmax(outputs.logits, dim=-1).squeeze().tolist()
-    offsets = encoded["offset_mapping"].squeeze().tolist()
-
-    # Reconstruct entities
-    entities = []
-    current = None
-
-    for pred_id, (start, end) in zip(preds, offsets):
-        if start == end == 0:
-            continue
-
-        label = id2label[pred_id]
-
-        if label == "O":
-            if current:
-                entities.append(current)
-                current = None
-            continue
-
-        prefix, ent_type = label.split("-")
-
-        if prefix == "B":
-            if current:
-                entities.append(current)
-            current = {"label": ent_type, "start": start, "end": end}
-
-        elif prefix == "I" and current and current["label"] == ent_type:
-            current["end"] = end
-
-        else:
-            if current:
-                entities.append(current)
-            current = None
-
-    if current:
-        entities.append(current)
-
-    # Extract fields
-    product = None
-    weight = None
-    ingredients = []
-
-    for ent in entities:
-        span = text[ent["start"]:ent["end"]].strip()
-
-        if ent["label"] == "PRODUCT":
-            product = span
-
-        elif ent["label"] == "WEIGHT":
-            weight = span
-
-        elif ent["label"] == "ING":
-            # Split merged ingredients
-            parts = re.split(r"[;,]+", span)
-            for p in parts:
-                p = p.strip()
-                if len(p) > 1:
-                    ingredients.append(p)
-
-    # Remove duplicates
-    ingredients = list(dict.fromkeys(ingredients))
-
-    # Save to database
-    db_entry = NERExtraction(
-        raw_text=text,
-        product_name=product,
-        weight=weight,
-        ingredients=ingredients
-    )
-    db.add(db_entry)
-    db.commit()
-    db.refresh(db_entry)
-
-    return {
-        "id": db_entry.id,
+    key = text_hash(text)
+
+    with metrics.stage("cache_lookup"):
+        cached = ner_cache.get(db, key)
+    if cached is not None:
+        metrics.EXTRACTIONS.inc("cache")
+        return cached
+    # Do not hold a pooled connection while waiting for the model
+    db.close()
+
+    # Structured texts skip the model; the rest is batched into a single forward pass
+    with metrics.stage("fast_path"):
+        extraction = fast_path.try_parse(text)
+    if extraction is not None:
+        metrics.EXTRACTIONS.inc("fast_path")
+    else:
+        extraction = batcher(text)
+        metrics.EXTRACTIONS.inc("model")
+    product = extraction["product_name"]
+    weight = extraction["weight"]
+    ingredients = extraction["ingredients"]
+
+    # Save to database (queued, written in bulk in the background)
+    try:
+        with metrics.stage("db_write"):
+            entry_id = extraction_writer.submit({
+                "raw_text": text,
+                "product_name": product,
+                "weight": weight,
+                "ingredients": ingredients,
+                "text_hash": key,
+                "model_version": ner_cache.version
+            })
+    except WriteQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    result = {
+        "id": entry_id,
         "product_name": product,
         "weight": weight,
         "ingredients": ingredients
     }
+    ner_cache.put(key, result)
+    return result
+
+@app.post("/extract/batch")
+def extract_entities_batch(input: NLPBatchInput, db: Session = Depends(get_db)):
+    """Extract many texts at once; results are returned in input order"""
+
+    texts = input.texts
+    if len(texts) > MAX_BATCH_TEXTS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_TEXTS} texts per batch")
+    if not texts:
+        return {"results": []}
+
+    keys = [text_hash(text) for text in texts]
+    with metrics.stage("cache_lookup"):
+        results = ner_cache.get_many(db, keys)
+    db.close()
+
+    # Only texts never seen before (once each) go through the model
+    pending = {}
+    for key, text in zip(keys, texts):
+        if key not in results:
+            pending.setdefault(key, text)
+
+    metrics.EXTRACTIONS.inc("cache", amount=len(texts) - len(pending))
+
+    if pending:
+        with metrics.stage("fast_path"):
+            extractions = [fast_path.try_parse(text) for text in pending.values()]
+        model_texts = [text for text, extraction in zip(pending.values(), extractions) if extraction is None]
+        metrics.EXTRACTIONS.inc("fast_path", amount=len(pending) - len(model_texts))
+        metrics.EXTRACTIONS.inc("model", amount=len(model_texts))
+        if model_texts:
+            # Bulk jobs bypass the micro-batcher so they do not delay interactive requests
+            predicted = iter(pipeline.extract(model_texts))
+            extractions = [extraction or next(predicted) for extraction in extractions]
+
+        # Queued together, written as multi-row INSERTs
+        try:
+            with metrics.stage("db_write"):
+                ids = extraction_writer.submit_many([
+                    {"raw_text": text, "text_hash": key, "model_version": ner_cache.version, **extraction}
+                    for (key, text), extraction in zip(pending.items(), extractions)
+                ])
+        except WriteQueueFull as e:
+            raise HTTPException(status_code=503, detail=str(e))
+
+        for key, entry_id, extraction in zip(pending, ids, extractions):
+            results[key] = {"id": entry_id, **extraction}
+            ner_cache.put(key, results[key])
+
+    return {"results": [results[key] for key in keys]}
 
 @app.post("/nlp/extract")
 def analyze_pipeline(input: NLPInput, db: Session = Depends(get_db)):
@@ -158,22 +230,22 @@ def analyze_pipeline(input: NLPInput, db: Session = Depends(get_db)):
     extraction = extract_entities(input, db)
 
     # STEP 2 — Call LCA
-    lca_url = discover("LCA-LITE")
-    lca_response = requests.post(
-        f"{lca_url}/lca/calc",
-        json={
-            "product_name": extraction["product_name"],
-            "weight": extraction["weight"],
-            "ingredients": extraction["ingredients"]
-        }
-    ).json()
+    with registry.use("LCA-LITE") as lca, metrics.stage("lca"):
+        lca_response = requests.post(
+            f"{lca.url}/lca/calc",
+            json={
+                "product_name": extraction["product_name"],
+                "weight": extraction["weight"],
+                "ingredients": extraction["ingredients"]
+            }
+        ).json()
 
     # STEP 3 — Call Scoring
-    scoring_url = discover("SCORING")
-    score_response = requests.post(
-        f"{scoring_url}/score/compute",
-        json=lca_response
-    ).json()
+    with registry.use("SCORING") as scoring, metrics.stage("scoring"):
+        score_response = requests.post(
+            f"{scoring.url}/score/compute",
+            json=lca_response
+        ).json()
 
     # STEP 4 — Aggregate result
     # return {
@@ -0,0 +1,199 @@
+"""
+Prometheus metrics for the NLP service, exposed in the text format at /metrics.
+
+Values live in an anonymous shared memory map created when this module is
+imported, i.e. in the serve.py master before it forks. Each worker writes to its
+own row (set_worker) and /metrics sums the rows, so whichever worker answers a
+scrape reports the totals of all of them. Label values are declared up front
+for the same reason: every slot must be allocated before the fork.
+
+Stage durations are also collected per request for the Server-Timing header.
+"""
+import itertools
+import mmap
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+MAX_WORKERS = int(os.getenv("NLP_METRICS_MAX_WORKERS", "16"))
+MAX_SLOTS = 4096
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+_memory = mmap.mmap(-1, MAX_WORKERS * MAX_SLOTS * 8)
+_values = np.frombuffer(_memory, dtype=np.float64).reshape(MAX_WORKERS, MAX_SLOTS)
+_row = _values[0]
+_lock = threading.Lock()
+_next_slot = 0
+_registry = []
+
+
+def set_worker(index: int):
+    """Called by each pre-forked worker: its metrics go to row `index`"""
+    global _row
+    if not 0 <= index < MAX_WORKERS:
+        raise ValueError(f"Worker {index} exceeds NLP_METRICS_MAX_WORKERS ({MAX_WORKERS})")
+    _row = _values[index]
+
+
+def _allocate(size: int) -> int:
+    global _next_slot
+    if _next_slot + size > MAX_SLOTS:
+        raise RuntimeError("Too many metric series")
+    start, _next_slot = _next_slot, _next_slot + size
+    return start
+
+
+class _Metric:
+    kind = ""
+    width = 1
+
+    def __init__(self, name: str, documentation: str, labels: Optional[Dict[str, Sequence[str]]] = None):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels or ())
+        combos = list(itertools.product(*(labels or {}).values()))
+        base = _allocate(len(combos) * self.width)
+        self.offsets = {combo: base + i * self.width for i, combo in enumerate(combos)}
+        _registry.append(self)
+
+    def _offset(self, labels: Sequence[str]) -> int:
+        try:
+            return self.offsets[tuple(labels)]
+        except KeyError:
+            raise ValueError(f"Undeclared labels {labels} for {self.name}")
+
+    def _label_text(self, combo, extra: str = "") -> str:
+        pairs = [f'{name}="{value}"' for name, value in zip(self.label_names, combo)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1):
+        offset = self._offset(labels)
+        with _lock:
+            _row[offset] += amount
+
+    def render(self, totals: np.ndarray):
+        lines = self._header()
+        for combo, offset in self.offsets.items():
+            lines.append(f"{self.name}{self._label_text(combo)} {totals[offset]:g}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, *labels: str):
+        _row[self._offset(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=None, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        # One count per bucket, +Inf, then the sum
+        self.width = len(self.buckets) + 2
+        super().__init__(name, documentation, labels)
+
+    def observe(self, value: float, *labels: str):
+        offset = self._offset(labels)
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with _lock:
+            _row[offset + index] += 1
+            _row[offset + self.width - 1] += value
+
+    def render(self, totals: np.ndarray):
+        lines = self._header()
+        for combo, offset in self.offsets.items():
+            counts = np.cumsum(totals[offset:offset + len(self.buckets) + 1])
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{self._label_text(combo, le)} {count:g}")
+            lines.append(f"{self.name}_sum{self._label_text(combo)} {totals[offset + self.width - 1]:g}")
+            lines.append(f"{self.name}_count{self._label_text(combo)} {counts[-1]:g}")
+        return lines
+
+
+def render() -> str:
+    totals = _values.sum(axis=0)
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render(totals))
+    return "\n".join(lines) + "\n"
+
+
+STAGES = ("fast_path", "cache_lookup", "queue_wait", "tokenize", "forward", "decode", "db_write", "lca", "scoring")
+ENDPOINTS = ("/extract", "/extract/batch", "/nlp/extract", "/health", "/metrics", "other")
+STATUSES = ("2xx", "3xx", "4xx", "5xx")
+
+STAGE_SECONDS = Histogram(
+    "nlp_stage_duration_seconds", "Time spent per processing stage", {"stage": STAGES}
+)
+REQUEST_SECONDS = Histogram(
+    "nlp_request_duration_seconds", "End-to-end request latency", {"endpoint": ENDPOINTS}
+)
+REQUESTS = Counter(
+    "nlp_requests_total", "HTTP requests by endpoint and status class", {"endpoint": ENDPOINTS, "status": STATUSES}
+)
+EXTRACTIONS = Counter(
+    "nlp_extractions_total", "Texts extracted, by the path that produced the result",
+    {"path": ("cache", "fast_path", "model")}
+)
+MICRO_BATCH_SIZE = Histogram(
+    "nlp_micro_batch_size", "Requests per micro-batch", buckets=SIZE_BUCKETS
+)
+FORWARD_BATCH_SIZE = Histogram(
+    "nlp_forward_batch_size", "Rows (text windows) per forward pass", buckets=SIZE_BUCKETS
+)
+QUEUE_DEPTH = Gauge(
+    "nlp_model_queue_depth", "Requests waiting for the micro-batcher"
+)
+
+# Stage durations of the current request (None outside a request)
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("nlp_timings", default=None)
+
+
+def start_timings() -> Dict[str, float]:
+    timings: Dict[str, float] = {}
+    _timings.set(timings)
+    return timings
+
+
+def add_timings(timings: Dict[str, float]):
+    """Attribute stage durations measured elsewhere (e.g. in the batcher thread) to the current request"""
+    current = _timings.get()
+    if current is not None:
+        for stage_name, seconds in timings.items():
+            current[stage_name] = current.get(stage_name, 0.0) + seconds
+
+
+def record(stage_name: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, stage_name)
+    add_timings({stage_name: seconds})
+
+
+@contextmanager
+def stage(stage_name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage_name, time.perf_counter() - start)
+
+
+def server_timing(timings: Dict[str, float]) -> str:
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items())
@@ -0,0 +1,134 @@
+import hashlib
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import inspect, text as sql_text
+from sqlalchemy.orm import Session
+
+from database.models import NERExtraction
+
+NER_CACHE_SIZE = int(os.getenv("NLP_CACHE_SIZE", "10000"))
+WEIGHT_FILES = ("model.safetensors", "pytorch_model.bin")
+
+
+def normalize_text(text: str) -> str:
+    """Canonical form used for cache keys: NFC, single spaces, trimmed"""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def model_version(model_path: str, backend: str) -> str:
+    """
+    Identifies the model that produced an extraction; cached rows from another
+    version are ignored. NLP_MODEL_VERSION overrides the computed value.
+    """
+    override = os.getenv("NLP_MODEL_VERSION")
+    if override:
+        return override
+    digest = hashlib.sha256(backend.encode())
+    config = Path(model_path, "config.json")
+    if config.exists():
+        digest.update(config.read_bytes())
+    for name in WEIGHT_FILES:
+        weights = Path(model_path, name)
+        if weights.exists():
+            stat = weights.stat()
+            digest.update(f"{name}:{stat.st_size}:{int(stat.st_mtime)}".encode())
+    return digest.hexdigest()[:16]
+
+
+def ensure_cache_columns(engine):
+    """Add the cache columns to an existing ner_extractions table (create_all does not alter tables)"""
+    columns = {c["name"] for c in inspect(engine).get_columns(NERExtraction.__tablename__)}
+    with engine.begin() as conn:
+        if "text_hash" not in columns:
+            conn.execute(sql_text("ALTER TABLE ner_extractions ADD COLUMN text_hash VARCHAR(64)"))
+        if "model_version" not in columns:
+            conn.execute(sql_text("ALTER TABLE ner_extractions ADD COLUMN model_version VARCHAR(64)"))
+        conn.execute(sql_text(
+            "CREATE INDEX IF NOT EXISTS ix_ner_extractions_text_hash ON ner_extractions (text_hash)"
+        ))
+
+
+class NERCache:
+    """
+    Extraction results keyed by the hash of the normalized text: an in-process
+    LRU in front of the ner_extractions table. Only rows written by the current
+    model version are reused.
+    """
+
+    def __init__(self, version: str, max_size: int = NER_CACHE_SIZE):
+        self.version = version
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"memory_hits": 0, "database_hits": 0, "misses": 0}
+
+    def _get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, result: dict):
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def get_many(self, db: Session, keys: Iterable[str]) -> Dict[str, dict]:
+        """Cached results (id + extraction) for the given hashes; misses are absent"""
+        found = {}
+        missing = []
+        for key in dict.fromkeys(keys):
+            entry = self._get(key)
+            if entry is not None:
+                found[key] = entry
+                self.counters["memory_hits"] += 1
+            else:
+                missing.append(key)
+
+        if missing:
+            rows = (
+                db.query(NERExtraction)
+                .filter(NERExtraction.text_hash.in_(missing), NERExtraction.model_version == self.version)
+                .order_by(NERExtraction.id.desc())
+                .all()
+            )
+            for row in rows:
+                if row.text_hash in found:
+                    continue
+                found[row.text_hash] = result = {
+                    "id": row.id,
+                    "product_name": row.product_name,
+                    "weight": row.weight,
+                    "ingredients": row.ingredients
+                }
+                self.put(row.text_hash, result)
+                self.counters["database_hits"] += 1
+            self.counters["misses"] += len([k for k in missing if k not in found])
+
+        return found
+
+    def get(self, db: Session, key: str) -> Optional[dict]:
+        return self.get_many(db, [key]).get(key)
+
+    def stats(self) -> dict:
+        lookups = sum(self.counters.values())
+        hits = lookups - self.counters["misses"]
+        return {
+            **self.counters,
+            "model_version": self.version,
+            "memory_size": len(self._entries),
+            "hit_ratio": round(hits / lookups, 3) if lookups else 0.0,
+        }
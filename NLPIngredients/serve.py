@@ -0,0 +1,107 @@
+"""
+Pre-forked NLP server.
+
+The master process imports the app once: tokenizer, config and the weights
+(memory-mapped from model.safetensors) are loaded before forking, so every
+worker shares them copy-on-write instead of holding its own copy. Workers
+accept connections on a socket bound by the master, and are restarted if
+they die.
+
+NLP_WORKERS          number of worker processes (default 1)
+NLP_TORCH_THREADS    intra-op threads per worker (default: CPU count / workers)
+
+Usage: NLP_WORKERS=4 python serve.py
+"""
+import os
+import signal
+import socket
+import sys
+import time
+
+import uvicorn
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8002"))
+WORKERS = int(os.getenv("NLP_WORKERS", "1"))
+TORCH_THREADS = int(os.getenv("NLP_TORCH_THREADS", "0")) or max(1, (os.cpu_count() or 1) // WORKERS)
+
+
+def bind_socket() -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((HOST, PORT))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app_module, sock: socket.socket, index: int):
+    import torch
+
+    import metrics
+
+    # One intra-op pool per worker, sized so workers do not oversubscribe the CPU
+    torch.set_num_threads(TORCH_THREADS)
+    # Connections opened by the master at import time must not be shared
+    app_module.engine.dispose(close=False)
+    # Each worker owns one row of the shared metrics (a restarted worker takes over its row)
+    metrics.set_worker(index)
+
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    config = uvicorn.Config(app_module.app, log_level="warning")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def spawn(app_module, sock: socket.socket, index: int) -> int:
+    pid = os.fork()
+    if pid == 0:
+        try:
+            run_worker(app_module, sock, index)
+        finally:
+            os._exit(0)
+    return pid
+
+
+def main():
+    # Load everything once, before forking (no inference here: torch thread
+    # pools must not exist in the master when it forks)
+    import main as app_module
+
+    sock = bind_socket()
+    # pid -> worker index
+    workers = {spawn(app_module, sock, index): index for index in range(WORKERS)}
+    print(f"NLP server on {HOST}:{PORT}: {WORKERS} workers x {TORCH_THREADS} torch threads")
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        index = workers.pop(pid, None)
+        if not stopping and index is not None:
+            print(f"Worker {pid} exited with status {status}, restarting")
+            time.sleep(1)
+            workers[spawn(app_module, sock, index)] = index
+
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
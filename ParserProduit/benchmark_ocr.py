@@ -0,0 +1,108 @@
+"""
+Latence et précision de l'OCR, sans puis avec prétraitement.
+
+Par défaut, des étiquettes synthétiques sont générées (photo haute résolution,
+fond bruité, texte incliné). Avec --fixtures DIR, chaque image DIR/x.jpg|png
+est comparée au texte attendu DIR/x.txt.
+
+Usage: python benchmark_ocr.py [--fixtures DIR] [--count 6]
+"""
+import argparse
+import base64
+import difflib
+import io
+import random
+import re
+import statistics
+import time
+from pathlib import Path
+
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+from services.ocr_service import OCRService
+
+LABELS = [
+    "Ingrédients : farine de blé, sucre, huile de palme, noisettes 13%, cacao maigre 7,4%, lait écrémé en poudre, émulsifiant : lécithines de soja, vanilline.",
+    "Ingrédients : eau, sucre, jus de citron à base de concentré 6%, acidifiant : acide citrique, arômes naturels, antioxydant : acide ascorbique.",
+    "Ingrédients : semoule de blé dur, eau, œufs frais 20%, sel. Peut contenir des traces de soja et de moutarde.",
+    "Ingrédients : lait entier pasteurisé, ferments lactiques, sucre 8%, préparation de fraise 10% (fraises, sucre, amidon de maïs).",
+]
+
+
+def load_font(size: int):
+    try:
+        return ImageFont.truetype("DejaVuSans.ttf", size)
+    except OSError:
+        return ImageFont.load_default()
+
+
+def synthetic_label(text: str, seed: int) -> bytes:
+    """Photo d'étiquette simulée: 4000 px de large, bruit, flou léger, rotation de quelques degrés"""
+    rng = random.Random(seed)
+    width, font = 4000, load_font(72)
+    words, lines, line = text.split(), [], ""
+    for word in words:
+        candidate = f"{line} {word}".strip()
+        if font.getlength(candidate) > width - 400:
+            lines.append(line)
+            line = word
+        else:
+            line = candidate
+    lines.append(line)
+
+    image = Image.new("RGB", (width, 400 + 110 * len(lines)), (rng.randint(200, 235),) * 3)
+    draw = ImageDraw.Draw(image)
+    for i, line in enumerate(lines):
+        draw.text((200, 200 + 110 * i), line, fill=(rng.randint(20, 60),) * 3, font=font)
+
+    noise = Image.effect_noise(image.size, 40).convert("RGB")
+    image = Image.blend(image, noise, 0.15).filter(ImageFilter.GaussianBlur(1.2))
+    image = image.rotate(rng.uniform(-3, 3), resample=Image.BICUBIC, expand=True, fillcolor=(220, 220, 220))
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def load_fixtures(directory: Path):
+    for path in sorted(directory.iterdir()):
+        if path.suffix.lower() in (".jpg", ".jpeg", ".png") and path.with_suffix(".txt").exists():
+            yield path.name, path.read_bytes(), path.with_suffix(".txt").read_text(encoding="utf-8")
+
+
+def accuracy(expected: str, actual: str) -> float:
+    normalize = lambda t: re.sub(r"\s+", " ", (t or "").lower()).strip()
+    return difflib.SequenceMatcher(None, normalize(expected), normalize(actual)).ratio()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fixtures", type=Path, help="Dossier d'images avec texte attendu (.txt)")
+    parser.add_argument("--count", type=int, default=6, help="Nombre d'étiquettes synthétiques")
+    args = parser.parse_args()
+
+    if args.fixtures:
+        samples = list(load_fixtures(args.fixtures))
+    else:
+        samples = [
+            (f"synthetic-{i}", synthetic_label(LABELS[i % len(LABELS)], i), LABELS[i % len(LABELS)])
+            for i in range(args.count)
+        ]
+
+    service = OCRService()
+    print(f"{len(samples)} images")
+    print(f"{'mode':<16} {'latence moy.':>12} {'p95':>8} {'précision':>10}")
+    for mode, preprocess in (("brut", False), ("prétraité", True)):
+        latencies, scores = [], []
+        for name, image_bytes, expected in samples:
+            image_base64 = base64.b64encode(image_bytes).decode()
+            start = time.perf_counter()
+            text = service.extract_text_from_image(image_base64, preprocess=preprocess, crop_ingredients=False)
+            latencies.append(time.perf_counter() - start)
+            scores.append(accuracy(expected, text))
+        p95 = sorted(latencies)[max(0, int(len(latencies) * 0.95) - 1)]
+        print(f"{mode:<16} {statistics.mean(latencies) * 1000:10.0f}ms {p95 * 1000:6.0f}ms {statistics.mean(scores):10.3f}")
+
+
+if __name__ == "__main__":
+    main()
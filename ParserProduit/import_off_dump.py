@@ -0,0 +1,219 @@
+"""
+Import d'un dump Open Food Facts (JSONL ou CSV, éventuellement .gz) dans le
+miroir local `off_products`.
+
+- lecture en flux, par lots de taille fixe: mémoire constante quel que soit le dump
+- PostgreSQL: COPY dans une table temporaire puis upsert ensembliste
+- reprise: le nombre de lignes traitées est enregistré avec chaque lot
+- mises à jour incrémentales: un dump delta peut être importé par-dessus,
+  seule une version plus récente (last_modified_t) remplace un produit
+
+Le service ne consulte le miroir qu'avec OFF_MIRROR_ENABLED=true.
+
+Usage:
+    python import_off_dump.py openfoodfacts-products.jsonl.gz
+    python import_off_dump.py en.openfoodfacts.org.products.csv.gz --format csv
+    python import_off_dump.py delta/openfoodfacts_products_1700000000.json.gz
+"""
+import argparse
+import csv
+import gzip
+import io
+import json
+import os
+import sys
+import time
+
+from database.connection import engine, SessionLocal, Base
+from models.database import OffProduct, OffImportState
+from services.off_mirror import compact_product
+
+BATCH_SIZE = 5000
+
+UPSERT_FROM_STAGING = """
+    INSERT INTO off_products (code, product, last_modified_t)
+    SELECT DISTINCT ON (code) code, product, last_modified_t
+    FROM off_staging
+    ORDER BY code, last_modified_t DESC NULLS LAST
+    ON CONFLICT (code) DO UPDATE SET
+        product = EXCLUDED.product,
+        last_modified_t = EXCLUDED.last_modified_t
+    WHERE off_products.last_modified_t IS NULL
+       OR EXCLUDED.last_modified_t >= off_products.last_modified_t
+"""
+
+SAVE_STATE = """
+    INSERT INTO off_import_state (source, fingerprint, lines_done, completed)
+    VALUES (%s, %s, %s, %s)
+    ON CONFLICT (source) DO UPDATE SET
+        fingerprint = EXCLUDED.fingerprint,
+        lines_done = EXCLUDED.lines_done,
+        completed = EXCLUDED.completed,
+        updated_at = now()
+"""
+
+
+def open_dump(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace")
+    return open(path, "r", encoding="utf-8", errors="replace")
+
+
+def detect_format(path: str) -> str:
+    name = path[:-3] if path.endswith(".gz") else path
+    return "csv" if name.endswith((".csv", ".tsv")) else "jsonl"
+
+
+def iter_records(f, fmt: str, skip: int):
+    """Produit (numéro de ligne, produit compacté); les `skip` premières lignes sont sautées sans être décodées"""
+    if fmt == "csv":
+        csv.field_size_limit(sys.maxsize)
+        reader = csv.DictReader(f, delimiter="\t", quoting=csv.QUOTE_NONE)
+        for line_no, row in enumerate(reader, start=1):
+            if line_no <= skip:
+                continue
+            yield line_no, row
+        return
+
+    for line_no, line in enumerate(f, start=1):
+        if line_no <= skip or not line.strip():
+            continue
+        try:
+            yield line_no, json.loads(line)
+        except json.JSONDecodeError:
+            print(f"⚠️  Ligne {line_no} ignorée (JSON invalide)")
+
+
+def to_row(raw: dict):
+    code = (raw.get("code") or "").strip()
+    if not code or len(code) > 32:
+        return None
+    modified = raw.get("last_modified_t")
+    try:
+        modified = int(modified) if modified not in (None, "") else None
+    except (TypeError, ValueError):
+        modified = None
+    return code, compact_product(raw), modified
+
+
+def flush_postgres(raw_conn, rows, source, fingerprint, lines_done):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for code, product, modified in rows:
+        writer.writerow([code, json.dumps(product, ensure_ascii=False), "" if modified is None else modified])
+    buffer.seek(0)
+
+    cursor = raw_conn.cursor()
+    cursor.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS off_staging (
+            code TEXT, product JSON, last_modified_t BIGINT
+        ) ON COMMIT DELETE ROWS
+    """)
+    cursor.copy_expert("COPY off_staging (code, product, last_modified_t) FROM STDIN WITH (FORMAT csv)", buffer)
+    cursor.execute(UPSERT_FROM_STAGING)
+    # Le point de reprise est validé dans la même transaction que le lot
+    cursor.execute(SAVE_STATE, (source, fingerprint, lines_done, False))
+    raw_conn.commit()
+    cursor.close()
+
+
+def flush_generic(rows, source, fingerprint, lines_done):
+    """Insertion par lots via l'ORM (bases autres que PostgreSQL, ex: tests locaux)"""
+    db = SessionLocal()
+    try:
+        for code, product, modified in rows:
+            existing = db.get(OffProduct, code)
+            if existing is None:
+                db.add(OffProduct(code=code, product=product, last_modified_t=modified))
+            elif existing.last_modified_t is None or (modified or 0) >= existing.last_modified_t:
+                existing.product = product
+                existing.last_modified_t = modified
+        db.merge(OffImportState(source=source, fingerprint=fingerprint, lines_done=lines_done, completed=False))
+        db.commit()
+    finally:
+        db.close()
+
+
+def load_state(source: str, fingerprint: str) -> int:
+    db = SessionLocal()
+    try:
+        state = db.get(OffImportState, source)
+        if state is None or state.fingerprint != fingerprint:
+            return 0
+        if state.completed:
+            return -1
+        return state.lines_done
+    finally:
+        db.close()
+
+
+def mark_completed(source: str, fingerprint: str, lines_done: int):
+    db = SessionLocal()
+    try:
+        db.merge(OffImportState(source=source, fingerprint=fingerprint, lines_done=lines_done, completed=True))
+        db.commit()
+    finally:
+        db.close()
+
+
+def import_dump(path: str, fmt: str = None, batch_size: int = BATCH_SIZE, restart: bool = False):
+    Base.metadata.create_all(bind=engine, tables=[OffProduct.__table__, OffImportState.__table__])
+
+    fmt = fmt or detect_format(path)
+    stat = os.stat(path)
+    source = os.path.basename(path)
+    fingerprint = f"{stat.st_size}-{int(stat.st_mtime)}"
+
+    skip = 0 if restart else load_state(source, fingerprint)
+    if skip < 0:
+        print(f"✅ {source} déjà importé (utiliser --restart pour réimporter)")
+        return
+    if skip:
+        print(f"⏩ Reprise de {source} après la ligne {skip}")
+
+    use_copy = engine.dialect.name == "postgresql"
+    raw_conn = engine.raw_connection() if use_copy else None
+
+    start = time.perf_counter()
+    imported = 0
+    lines_done = skip
+    batch = []
+
+    def flush():
+        if use_copy:
+            flush_postgres(raw_conn, batch, source, fingerprint, lines_done)
+        else:
+            flush_generic(batch, source, fingerprint, lines_done)
+
+    print(f"📥 Import de {path} (format {fmt}, lots de {batch_size})...")
+    try:
+        with open_dump(path) as f:
+            for lines_done, raw in iter_records(f, fmt, skip):
+                row = to_row(raw)
+                if row is not None:
+                    batch.append(row)
+                if len(batch) >= batch_size:
+                    flush()
+                    imported += len(batch)
+                    batch = []
+                    rate = imported / (time.perf_counter() - start)
+                    print(f"   {lines_done} lignes lues, {imported} produits importés ({rate:.0f}/s)")
+            if batch:
+                flush()
+                imported += len(batch)
+    finally:
+        if raw_conn is not None:
+            raw_conn.close()
+
+    mark_completed(source, fingerprint, lines_done)
+    print(f"✅ Import terminé: {imported} produits en {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import d'un dump Open Food Facts dans le miroir local")
+    parser.add_argument("path", help="Fichier JSONL ou CSV (éventuellement .gz)")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="Détecté depuis l'extension par défaut")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--restart", action="store_true", help="Ignore le point de reprise")
+    args = parser.parse_args()
+    import_dump(args.path, args.format, args.batch_size, args.restart)
@@ -26,12 +26,15 @@ app.add_middleware(
 CONSUL_URL = "http://consul:8500/v1/agent/service/register"
 
 def register_service(name: str, service_name: str, port: int):
+    address = socket.gethostbyname(socket.gethostname())
+    # One ID per replica so scaled-out instances do not overwrite each other
     payload = {
+        "ID": f"{service_name}-{socket.gethostname()}",
         "Name": name,
-        "Address": socket.gethostbyname(socket.gethostname()),
+        "Address": address,
         "Port": port,
         "Check": {
-            "HTTP": f"http://{service_name}:{port}/health",
+            "HTTP": f"http://{address}:{port}/health",
             "Interval": "10s"
         }
     }
@@ -41,6 +44,11 @@ def register_service(name: str, service_name: str, port: int):
 def startup():
     register_service("PARSER-PRODUIT", "parser-produit", 8001)
 
+@app.on_event("shutdown")
+async def shutdown():
+    await product.barcode_service.aclose()
+    product.ocr_pool.shutdown()
+
 app.include_router(product.router, prefix="/product", tags=["product"])
 @app.get("/")
 async def root():
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, DateTime, JSON, Text
+from sqlalchemy import Column, String, Integer, BigInteger, Boolean, DateTime, JSON, Text
 from sqlalchemy.sql import func
 from database.connection import Base
 
@@ -16,4 +16,23 @@ class Product(Base):
     raw_data = Column(JSON)  
     normalized_data = Column(JSON)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
\ No newline at end of file
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+class OffProduct(Base):
+    """Miroir local d'Open Food Facts (champs utiles à BarcodeService uniquement)"""
+    __tablename__ = "off_products"
+
+    code = Column(String(32), primary_key=True)
+    product = Column(JSON, nullable=False)
+    last_modified_t = Column(BigInteger, index=True)
+
+
+class OffImportState(Base):
+    """Point de reprise d'un import de dump Open Food Facts"""
+    __tablename__ = "off_import_state"
+
+    source = Column(String(255), primary_key=True)
+    fingerprint = Column(String(64), nullable=False)
+    lines_done = Column(BigInteger, nullable=False, default=0)
+    completed = Column(Boolean, nullable=False, default=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
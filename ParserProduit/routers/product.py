@@ -1,20 +1,37 @@
 from fastapi import APIRouter, HTTPException, Body
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from typing import List, Dict, Any
+import asyncio
 import json
+import os
 
 from models.product import (
     ProductParseRequest,
     ProductParseResponse,
     BatchProductParseRequest
 )
-from services.barcode_service import BarcodeService
+from services.barcode_service import BarcodeLookupError, BarcodeService
 from services.ocr_service import OCRService
+from services.ocr_worker import OCRWorkerPool, OCRQueueFull
+from services.ocr_cache import OCRCache
 from services.scraper_service import ScraperService
+from services.product_cache import ProductCache
+from services.off_mirror import OffMirror, OFF_MIRROR_ENABLED
+
+from ecolabel_common.singleflight import SingleFlight
 
 router = APIRouter()
-barcode_service = BarcodeService()
+barcode_service = BarcodeService(mirror=OffMirror() if OFF_MIRROR_ENABLED else None)
 ocr_service = OCRService()
+ocr_pool = OCRWorkerPool()
+ocr_cache = OCRCache()
 scraper_service = ScraperService()
+# Scans simultanés du même GTIN: une seule recherche amont partagée
+barcode_lookups = SingleFlight()
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_DEADLINE = float(os.getenv("BATCH_DEADLINE", "60"))
 
 def _filter_product_data(product_data: Dict[str, Any]) -> Dict[str, Any]:
     """Filtre les données pour ne garder que les champs demandés"""
@@ -28,6 +45,39 @@ def _filter_product_data(product_data: Dict[str, Any]) -> Dict[str, Any]:
     }
     return filtered
 
+async def _extract_text(image_base64: str):
+    """OCR dans le pool de processus; 503 si la file d'attente est pleine"""
+    try:
+        return await ocr_pool.extract_text(image_base64)
+    except OCRQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+async def _ocr_product_info(image_base64: str):
+    """
+    Texte OCR et informations extraites, avec cache indexé par le contenu de l'image.
+    Retourne (None, None) si aucun texte n'a pu être extrait.
+    """
+    try:
+        image_bytes = OCRCache.decode(image_base64)
+    except Exception as e:
+        print(f"Erreur décodage image: {e}")
+        return None, None
+
+    key, phash, cached = await run_in_threadpool(ocr_cache.lookup, image_bytes)
+    if cached is not None:
+        print("📦 Résultat OCR servi depuis le cache")
+        return cached["text"], cached["info"]
+
+    ocr_text = await _extract_text(image_base64)
+    if not ocr_text:
+        return None, None
+    ocr_data = ocr_service.parse_product_info_from_text(ocr_text)
+    await run_in_threadpool(ocr_cache.store, key, phash, ocr_text, ocr_data)
+    return ocr_text, ocr_data
+
+# Cache produit: LRU mémoire + table `products`
+product_cache = ProductCache(normalize=_filter_product_data)
+
 @router.post("/parse", response_model=ProductParseResponse)
 async def parse_product(
     request: ProductParseRequest,
@@ -36,33 +86,29 @@ async def parse_product(
     """
     Parse un produit à partir de son code-barres
     Retourne un JSON avec: gtin, name, brand, composition, packaging, netWeight_g
-    MODE TEST: Les données ne sont PAS enregistrées en base de données
+    Les produits trouvés sont mis en cache (mémoire + base de données)
     """
     try:
         print(f"\n{'='*80}")
         print(f"🔍 Requête reçue - Code-barres: {request.barcode}")
         print(f"{'='*80}")
         
-        # ============================================
-        # PARTIE COMMENTÉE: Vérification en base de données
-        # ============================================
-        # existing_product = db.query(Product).filter(Product.gtin == request.barcode).first()
-        # if existing_product:
-        #     filtered_data = _filter_product_data(existing_product.normalized_data)
-        #     response = ProductParseResponse(
-        #         success=True,
-        #         gtin=request.barcode,
-        #         product_data=filtered_data,
-        #         source="database"
-        #     )
-        #     print("\n📦 JSON RETOURNÉ (depuis la base de données):")
-        #     print(json.dumps(response.dict(), indent=2, ensure_ascii=False))
-        #     print(f"{'='*80}\n")
-        #     return response
-        
-        # 1. Recherche via bases de données (Open Food Facts, Open Beauty Facts, etc.)
-        print("🔎 Recherche via bases de données...")
-        product_data = barcode_service.search_by_barcode(request.barcode)
+        # 1. Cache (mémoire puis base de données), sinon recherche via les bases
+        #    externes (Open Food Facts, Open Beauty Facts, etc.)
+        print("🔎 Recherche via cache / bases de données...")
+        try:
+            product_data, tier = await product_cache.get_or_load(
+                request.barcode,
+                lambda: barcode_lookups.do(
+                    request.barcode,
+                    lambda: barcode_service.search_by_barcode(request.barcode)
+                )
+            )
+            print(f"📦 Niveau de cache: {tier}")
+        except BarcodeLookupError as e:
+            # Sources indisponibles: rien n'est mis en cache, on tente OCR / scraping
+            print(f"⚠️ {e}")
+            product_data = None
         
         # Récupérer la source depuis les données retournées (si trouvé)
         if product_data:
@@ -73,9 +119,8 @@ async def parse_product(
         # 2. Si pas trouvé et image fournie, utiliser OCR
         if not product_data and request.image_base64:
             print("🔎 Tentative avec OCR...")
-            ocr_text = ocr_service.extract_text_from_image(request.image_base64)
+            ocr_text, ocr_data = await _ocr_product_info(request.image_base64)
             if ocr_text:
-                ocr_data = ocr_service.parse_product_info_from_text(ocr_text)
                 product_data = {
                     "gtin": request.barcode,
                     **ocr_data
@@ -85,7 +130,7 @@ async def parse_product(
         # 3. Si toujours pas trouvé, essayer le scraping
         if not product_data:
             print("🔎 Tentative avec web scraping...")
-            scraped_data = scraper_service.search_product_info(request.barcode)
+            scraped_data = await run_in_threadpool(scraper_service.search_product_info, request.barcode)
             if scraped_data:
                 product_data = scraped_data
                 source = scraped_data.get("source", "scraper")
@@ -107,24 +152,6 @@ async def parse_product(
         print(f"\n✅ Données filtrées (format final):")
         print(json.dumps(filtered_data, indent=2, ensure_ascii=False))
         
-        # ============================================
-        # PARTIE COMMENTÉE: Sauvegarde en base de données
-        # ============================================
-        # new_product = Product(
-        #     gtin=request.barcode,
-        #     name=filtered_data.get("name"),
-        #     brand=filtered_data.get("brand"),
-        #     category=None,
-        #     composition=filtered_data.get("composition"),
-        #     origin=None,
-        #     raw_data=product_data,
-        #     normalized_data=filtered_data
-        # )
-        # db.add(new_product)
-        # db.commit()
-        # db.refresh(new_product)
-        # print("💾 Données sauvegardées en base de données")
-        
         response = ProductParseResponse(
             success=True,
             gtin=request.barcode,
@@ -146,26 +173,91 @@ async def parse_product(
         print(f"{'='*80}\n")
         raise HTTPException(status_code=500, detail=f"Erreur serveur: {str(e)}")
 
-@router.post("/parse/batch", response_model=List[ProductParseResponse])
-async def parse_batch_products(
-    request: BatchProductParseRequest,
-    # db: Session = Depends(get_db)  # Commenté temporairement
-):
-    """Parse un lot de produits (MODE TEST: pas de sauvegarde en base)"""
-    results = []
-    for product_request in request.products:
-        try:
-            result = await parse_product(product_request)  # Retirer db
-            results.append(result)
-        except Exception as e:
-            results.append(ProductParseResponse(
+@router.get("/stats")
+async def get_stats():
+    """Compteurs de déduplication des recherches, des caches produit et OCR et du pool OCR"""
+    return {
+        "barcode_lookups": barcode_lookups.stats(),
+        "product_cache": product_cache.stats(),
+        "ocr_cache": ocr_cache.stats(),
+        "ocr_pool": ocr_pool.stats(),
+    }
+
+async def _parse_or_error(product_request: ProductParseRequest) -> ProductParseResponse:
+    try:
+        return await parse_product(product_request)
+    except Exception as e:
+        message = e.detail if isinstance(e, HTTPException) else str(e)
+        return ProductParseResponse(
+            success=False,
+            gtin=product_request.barcode,
+            product_data={},
+            source="error",
+            message=message
+        )
+
+async def _stream_batch(products: List[ProductParseRequest]):
+    """Parse les produits en parallèle et produit une ligne NDJSON par produit dès qu'il est prêt"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + BATCH_DEADLINE
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    # Un même GTIN (sans image) n'est parsé qu'une fois pour tout le lot
+    groups: Dict[Any, List[int]] = {}
+    for index, product_request in enumerate(products):
+        key = product_request.barcode if not product_request.image_base64 else ("image", index)
+        groups.setdefault(key, []).append(index)
+
+    async def run(product_request: ProductParseRequest) -> ProductParseResponse:
+        async with semaphore:
+            return await _parse_or_error(product_request)
+
+    tasks = {
+        asyncio.create_task(run(products[indexes[0]])): indexes
+        for indexes in groups.values()
+    }
+    pending = set(tasks)
+
+    def lines(indexes: List[int], result: ProductParseResponse):
+        for index in indexes:
+            yield json.dumps({"index": index, **result.dict()}, ensure_ascii=False) + "\n"
+
+    try:
+        while pending:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                for line in lines(tasks[task], task.result()):
+                    yield line
+
+        # Budget du lot épuisé: les produits restants sont signalés en erreur
+        for task in pending:
+            indexes = tasks[task]
+            timeout_result = ProductParseResponse(
                 success=False,
-                gtin=product_request.barcode,
+                gtin=products[indexes[0]].barcode,
                 product_data={},
                 source="error",
-                message=str(e)
-            ))
-    return results
+                message=f"Délai du lot dépassé ({BATCH_DEADLINE:g}s)"
+            )
+            for line in lines(indexes, timeout_result):
+                yield line
+    finally:
+        for task in pending:
+            task.cancel()
+
+@router.post("/parse/batch")
+async def parse_batch_products(
+    request: BatchProductParseRequest,
+):
+    """
+    Parse un lot de produits en parallèle (BATCH_CONCURRENCY produits à la fois,
+    BATCH_DEADLINE secondes au total). Les résultats sont renvoyés en NDJSON au fur
+    et à mesure, une ligne par produit avec son `index` dans le lot.
+    """
+    return StreamingResponse(_stream_batch(request.products), media_type="application/x-ndjson")
 
 @router.post("/parse-from-image", response_model=ProductParseResponse)
 async def parse_product_from_image(
@@ -193,14 +285,11 @@ async def parse_product_from_image(
 
         # Extraire le texte avec OCR
         print("🔎 Extraction de texte avec OCR...")
-        ocr_text = ocr_service.extract_text_from_image(image_base64)
+        ocr_text, ocr_data = await _ocr_product_info(image_base64)
 
         if not ocr_text:
             raise HTTPException(status_code=400, detail="Impossible d'extraire le texte de l'image")
 
-        # Parser les informations depuis le texte OCR
-        ocr_data = ocr_service.parse_product_info_from_text(ocr_text)
-
         # Construire les données du produit avec les informations fournies
         product_data = {
             "gtin": "IMAGE_ONLY",  # Pas de code-barres pour les images
@@ -1,121 +1,183 @@
-import requests
+import asyncio
+import os
+import httpx
+from starlette.concurrency import run_in_threadpool
 from typing import Optional, Dict, Any
 import re
 
+# Budget global d'une recherche, toutes sources confondues (secondes)
+LOOKUP_DEADLINE = float(os.getenv("BARCODE_LOOKUP_DEADLINE", "12"))
+SOURCE_TIMEOUT = float(os.getenv("BARCODE_SOURCE_TIMEOUT", "10"))
+
+
+class BarcodeLookupError(Exception):
+    """Aucun résultat, mais au moins une source en erreur ou hors délai: le produit peut exister"""
+
 class BarcodeService:
     """Service pour rechercher des produits par code-barres - Multi-sources incluant pharmaceutiques"""
     
-    def __init__(self):
+    # Ordre de priorité: le premier résultat positif dans cet ordre l'emporte
+    PRIORITY = ["openfoodfacts", "openbeautyfacts", "openproductfacts", "upcitemdb"]
+    
+    def __init__(self, apis: Optional[Dict[str, str]] = None, deadline: float = LOOKUP_DEADLINE, mirror=None):
         self.headers = {"User-Agent": "EcoLabel-MS/1.0"}
+        self.deadline = deadline
+        # Miroir local d'Open Food Facts consulté avant tout appel réseau (optionnel)
+        self.mirror = mirror
         
-        # URLs des différentes bases de données
+        # URLs des différentes bases de données (surchargeables pour les tests)
         self.apis = {
             "openfoodfacts": "https://world.openfoodfacts.org/api/v0/product",
             "openbeautyfacts": "https://world.openbeautyfacts.org/api/v0/product",
             "openproductfacts": "https://world.openproductsfacts.org/api/v0/product",
+            "upcitemdb": "https://api.upcitemdb.com/prod/trial/lookup",
+        }
+        if apis:
+            self.apis.update(apis)
+        
+        self.labels = {
+            "openfoodfacts": "Open Food Facts",
+            "openbeautyfacts": "Open Beauty Facts",
+            "openproductfacts": "Open Products Facts",
+            "upcitemdb": "UPC Item DB",
         }
+        self.searchers = {
+            "openfoodfacts": self._search_openfoodfacts,
+            "openbeautyfacts": self._search_openbeautyfacts,
+            "openproductfacts": self._search_openproductfacts,
+            "upcitemdb": self._search_generic,
+        }
+        
+        # Clients HTTP keep-alive partagés, créés à la première recherche
+        self._client: Optional[httpx.AsyncClient] = None
+        self._insecure_client: Optional[httpx.AsyncClient] = None
+    
+    def _get_client(self, verify: bool = True) -> httpx.AsyncClient:
+        if verify:
+            if self._client is None or self._client.is_closed:
+                self._client = httpx.AsyncClient(headers=self.headers, timeout=SOURCE_TIMEOUT)
+            return self._client
+        if self._insecure_client is None or self._insecure_client.is_closed:
+            self._insecure_client = httpx.AsyncClient(headers=self.headers, timeout=SOURCE_TIMEOUT, verify=False)
+        return self._insecure_client
     
-    def search_by_barcode(self, barcode: str) -> Optional[Dict[str, Any]]:
+    async def aclose(self):
+        for client in (self._client, self._insecure_client):
+            if client is not None:
+                await client.aclose()
+    
+    async def search_by_barcode(self, barcode: str) -> Optional[Dict[str, Any]]:
         """
-        Recherche un produit par code-barres dans plusieurs sources
-        Ordre: Open Food Facts → Open Beauty Facts → Open Products Facts → Recherche générique
+        Recherche un produit par code-barres dans plusieurs sources, interrogées en parallèle
+        Priorité: Open Food Facts → Open Beauty Facts → Open Products Facts → Recherche générique
+        Un résultat n'est retenu que si toutes les sources plus prioritaires ont échoué;
+        dès qu'il est retenu, les requêtes moins prioritaires encore en cours sont annulées.
+        Retourne None si toutes les sources ont répondu « inconnu »; lève
+        BarcodeLookupError si l'une d'elles a échoué ou n'a pas répondu à temps.
         """
-        # 1. Essayer Open Food Facts (produits alimentaires)
-        print(f"🔍 Recherche dans Open Food Facts...")
-        product_data = self._search_openfoodfacts(barcode)
-        if product_data:
-            print(f"✅ Trouvé dans Open Food Facts")
-            return product_data
-        
-        # 2. Essayer Open Beauty Facts (cosmétiques, produits de beauté, compléments)
-        print(f"🔍 Recherche dans Open Beauty Facts...")
-        product_data = self._search_openbeautyfacts(barcode)
-        if product_data:
-            print(f"✅ Trouvé dans Open Beauty Facts")
-            return product_data
-        
-        # 3. Essayer Open Products Facts (autres produits)
-        print(f"🔍 Recherche dans Open Products Facts...")
-        product_data = self._search_openproductfacts(barcode)
-        if product_data:
-            print(f"✅ Trouvé dans Open Products Facts")
-            return product_data
+        # 0. Miroir local d'Open Food Facts: même normalisation que l'API en ligne
+        if self.mirror is not None:
+            data = await run_in_threadpool(self.mirror.lookup, barcode)
+            if data:
+                print(f"✅ Trouvé dans le miroir local Open Food Facts")
+                return self._normalize_data(data, "openfoodfacts")
         
-        # 4. Essayer recherche générique (pour produits pharmaceutiques et autres)
-        print(f"🔍 Recherche générique (produits pharmaceutiques, etc.)...")
-        product_data = self._search_generic(barcode)
-        if product_data:
-            print(f"✅ Trouvé via recherche générique")
-            return product_data
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline
+        tasks = {
+            source: asyncio.create_task(self.searchers[source](barcode))
+            for source in self.PRIORITY
+        }
         
-        print(f"❌ Produit non trouvé dans aucune base de données")
-        return None
-    
-    def _search_openfoodfacts(self, barcode: str) -> Optional[Dict[str, Any]]:
-        """Recherche dans Open Food Facts"""
+        failed = []
         try:
-            url = f"{self.apis['openfoodfacts']}/{barcode}.json"
-            response = requests.get(url, headers=self.headers, timeout=10)
-            response.raise_for_status()
+            for i, source in enumerate(self.PRIORITY):
+                remaining = deadline - loop.time()
+                try:
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError
+                    product_data = await asyncio.wait_for(tasks[source], remaining)
+                except asyncio.TimeoutError:
+                    print(f"⏱️ Budget de {self.deadline}s épuisé en attendant {self.labels[source]}")
+                    # Des sources moins prioritaires ont pu répondre entre-temps
+                    product_data = self._first_completed(tasks, self.PRIORITY[i + 1:])
+                    if product_data:
+                        return product_data
+                    raise BarcodeLookupError(f"Budget de {self.deadline}s épuisé pour {barcode}")
+                except Exception as e:
+                    print(f"Erreur {self.labels[source]}: {e}")
+                    failed.append(source)
+                    continue
+                if product_data:
+                    print(f"✅ Trouvé dans {self.labels[source]}")
+                    return product_data
             
-            data = response.json()
-            if data and data.get("status") == 1:
-                return self._normalize_data(data, "openfoodfacts")
-            return None
-        except Exception as e:
-            print(f"Erreur Open Food Facts: {e}")
+            if failed:
+                raise BarcodeLookupError(
+                    f"{barcode}: non trouvé, sources en erreur: {', '.join(self.labels[s] for s in failed)}"
+                )
+            print(f"❌ Produit non trouvé dans aucune base de données")
             return None
+        finally:
+            for task in tasks.values():
+                if not task.done():
+                    task.cancel()
     
-    def _search_openbeautyfacts(self, barcode: str) -> Optional[Dict[str, Any]]:
-        """Recherche dans Open Beauty Facts (inclut compléments et certains pharmaceutiques)"""
-        try:
-            url = f"{self.apis['openbeautyfacts']}/{barcode}.json"
-            response = requests.get(url, headers=self.headers, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
-            if data and data.get("status") == 1:
-                return self._normalize_data(data, "openbeautyfacts")
-            return None
-        except Exception as e:
-            print(f"Erreur Open Beauty Facts: {e}")
-            return None
+    def _first_completed(self, tasks: Dict[str, asyncio.Task], sources) -> Optional[Dict[str, Any]]:
+        """Premier résultat positif, dans l'ordre de priorité, parmi les requêtes déjà terminées"""
+        for source in sources:
+            task = tasks[source]
+            if task.done() and not task.cancelled() and task.exception() is None and task.result():
+                print(f"✅ Trouvé dans {self.labels[source]} (avant l'échéance)")
+                return task.result()
+        print(f"❌ Aucune source terminée avec un résultat avant l'échéance")
+        return None
     
-    def _search_openproductfacts(self, barcode: str) -> Optional[Dict[str, Any]]:
-      """Recherche dans Open Products Facts"""
-      try:
-        url = f"{self.apis['openproductfacts']}/{barcode}.json"
-        # Désactiver la vérification SSL si nécessaire (non recommandé en production)
-        response = requests.get(url, headers=self.headers, timeout=10, verify=False)
+    async def _search_open_facts(self, source: str, barcode: str, verify: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        Recherche dans une base Open Facts (même API pour toutes)
+        None si la base ne connaît pas le produit; les erreurs réseau/HTTP sont propagées
+        """
+        url = f"{self.apis[source]}/{barcode}.json"
+        response = await self._get_client(verify).get(url)
+        if response.status_code == 404:
+            return None
         response.raise_for_status()
         
         data = response.json()
         if data and data.get("status") == 1:
-            return self._normalize_data(data, "openproductfacts")
-        return None
-      except Exception as e:
-        print(f"Erreur Open Products Facts: {e}")
+            return self._normalize_data(data, source)
         return None
     
-    def _search_generic(self, barcode: str) -> Optional[Dict[str, Any]]:
+    async def _search_openfoodfacts(self, barcode: str) -> Optional[Dict[str, Any]]:
+        """Recherche dans Open Food Facts"""
+        return await self._search_open_facts("openfoodfacts", barcode)
+    
+    async def _search_openbeautyfacts(self, barcode: str) -> Optional[Dict[str, Any]]:
+        """Recherche dans Open Beauty Facts (inclut compléments et certains pharmaceutiques)"""
+        return await self._search_open_facts("openbeautyfacts", barcode)
+    
+    async def _search_openproductfacts(self, barcode: str) -> Optional[Dict[str, Any]]:
+        """Recherche dans Open Products Facts"""
+        # Désactiver la vérification SSL si nécessaire (non recommandé en production)
+        return await self._search_open_facts("openproductfacts", barcode, verify=False)
+    
+    async def _search_generic(self, barcode: str) -> Optional[Dict[str, Any]]:
         """
         Recherche générique pour produits pharmaceutiques et autres
         Utilise uniquement des sources gratuites
         """
         # Option 1: Recherche via UPC Item DB (gratuit, limité mais fonctionne)
-        try:
-            url = f"https://api.upcitemdb.com/prod/trial/lookup"
-            params = {"upc": barcode}
-            response = requests.get(url, params=params, headers=self.headers, timeout=10)
-            
-            if response.status_code == 200:
-                data = response.json()
-                if data.get("code") == "OK" and data.get("items"):
-                    item = data["items"][0]
-                    print(f"✅ Trouvé via UPC Item DB")
-                    return self._normalize_upcitemdb_data(item, "upcitemdb")
-        except Exception as e:
-            print(f"Erreur UPC Item DB: {e}")
+        # 404 = inconnu; les autres erreurs (quota 429, 5xx, réseau) sont propagées
+        params = {"upc": barcode}
+        response = await self._get_client().get(self.apis["upcitemdb"], params=params)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        data = response.json()
+        if data.get("code") == "OK" and data.get("items"):
+            item = data["items"][0]
+            return self._normalize_upcitemdb_data(item, "upcitemdb")
         
         # Option 2: Barcode Lookup (COMMENTÉ - nécessite clé API payante)
         # Décommentez seulement si vous avez une clé API
@@ -126,7 +188,7 @@ class BarcodeService:
         #         "formatted": "y",
         #         "key": "VOTRE_CLE_API_ICI"  # Nécessite inscription et clé API
         #     }
-        #     response = requests.get(url, params=params, headers=self.headers, timeout=10)
+        #     response = await self._get_client().get(url, params=params)
         #     if response.status_code == 200:
         #         data = response.json()
         #         if data.get("products") and len(data["products"]) > 0:
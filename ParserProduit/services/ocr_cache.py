@@ -0,0 +1,166 @@
+import base64
+import hashlib
+import io
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from PIL import Image
+
+from services.ocr_preprocessing import pipeline_signature
+from services.ocr_service import OCR_CROP_INGREDIENTS, OCR_PREPROCESS
+from services.product_cache import LRUCache
+
+OCR_CACHE_SIZE = int(os.getenv("OCR_CACHE_SIZE", "512"))
+# Niveau disque optionnel (désactivé si la variable est absente)
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR")
+# Hachage perceptuel: retrouve aussi les photos quasi identiques (re-scan, recompression)
+OCR_CACHE_PERCEPTUAL = os.getenv("OCR_CACHE_PERCEPTUAL", "false").lower() == "true"
+OCR_CACHE_MAX_DISTANCE = int(os.getenv("OCR_CACHE_MAX_DISTANCE", "4"))
+
+
+def perceptual_hash(image_bytes: bytes) -> int:
+    """dHash 64 bits: compare la luminosité de pixels voisins sur une vignette 9x8"""
+    image = Image.open(io.BytesIO(image_bytes))
+    # draft() laisse le décodeur JPEG réduire l'image directement: bien plus rapide
+    image.draft("L", (64, 64))
+    pixels = list(image.convert("L").resize((9, 8), Image.BILINEAR).getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left, right = pixels[row * 9 + col], pixels[row * 9 + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+class OCRCache:
+    """
+    Cache des résultats OCR (texte brut + informations extraites) indexé par
+    le SHA-256 des octets de l'image décodée et de la configuration du
+    pipeline OCR (prétraitement, recadrage, PREPROCESS_VERSION): un changement
+    de configuration ne sert jamais un texte produit par l'ancien pipeline.
+    """
+
+    def __init__(
+        self,
+        max_size: int = OCR_CACHE_SIZE,
+        cache_dir: Optional[str] = OCR_CACHE_DIR,
+        perceptual: bool = OCR_CACHE_PERCEPTUAL,
+        max_distance: int = OCR_CACHE_MAX_DISTANCE,
+        pipeline: Optional[str] = None,
+    ):
+        self.memory = LRUCache(max_size)
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.perceptual = perceptual
+        self.max_distance = max_distance
+        self.pipeline = pipeline or pipeline_signature(OCR_PREPROCESS, OCR_CROP_INGREDIENTS)
+        self._lock = threading.Lock()
+        self.counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "perceptual_hits": 0,
+            "misses": 0,
+        }
+
+    @staticmethod
+    def decode(image_base64: str) -> bytes:
+        return base64.b64decode(image_base64)
+
+    def lookup(self, image_bytes: bytes) -> Tuple[str, Optional[int], Optional[Dict[str, Any]]]:
+        """Retourne (clé, hachage perceptuel, entrée en cache ou None)"""
+        digest = hashlib.sha256(self.pipeline.encode())
+        digest.update(b"\0")
+        digest.update(image_bytes)
+        key = digest.hexdigest()
+
+        with self._lock:
+            entry = self.memory.get(key)
+        if entry is not None:
+            self.counters["memory_hits"] += 1
+            return key, None, entry[0]
+
+        value = self._read_disk(key)
+        if value is not None:
+            self.counters["disk_hits"] += 1
+            with self._lock:
+                self.memory.set(key, value)
+            return key, value.get("phash"), value
+
+        phash = None
+        if self.perceptual:
+            try:
+                phash = perceptual_hash(image_bytes)
+            except Exception as e:
+                print(f"Erreur hachage perceptuel: {e}")
+            if phash is not None:
+                value = self._nearest(phash)
+                if value is not None:
+                    self.counters["perceptual_hits"] += 1
+                    # La même photo renvoyée ensuite sera un succès exact
+                    with self._lock:
+                        self.memory.set(key, value)
+                    return key, phash, value
+
+        self.counters["misses"] += 1
+        return key, phash, None
+
+    def store(self, key: str, phash: Optional[int], text: str, info: Dict[str, Any]):
+        value = {"text": text, "info": info, "phash": phash}
+        with self._lock:
+            self.memory.set(key, value)
+        self._write_disk(key, value)
+
+    def _nearest(self, phash: int) -> Optional[Dict[str, Any]]:
+        best, best_distance = None, self.max_distance + 1
+        with self._lock:
+            for value, _ in self.memory.values():
+                if value.get("phash") is None:
+                    continue
+                distance = bin(value["phash"] ^ phash).count("1")
+                if distance < best_distance:
+                    best, best_distance = value, distance
+        return best
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def _read_disk(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.cache_dir:
+            return None
+        path = self._path(key)
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Erreur lecture cache OCR {path}: {e}")
+            return None
+
+    def _write_disk(self, key: str, value: Dict[str, Any]):
+        if not self.cache_dir:
+            return
+        path = self._path(key)
+        try:
+            path.parent.mkdir(exist_ok=True)
+            # Écriture atomique: un lecteur concurrent ne voit jamais un fichier partiel
+            tmp = path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(value, ensure_ascii=False), encoding="utf-8")
+            tmp.replace(path)
+        except Exception as e:
+            print(f"Erreur écriture cache OCR {path}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = sum(self.counters.values())
+        hits = lookups - self.counters["misses"]
+        return {
+            **self.counters,
+            "memory_size": len(self.memory),
+            "disk_enabled": self.cache_dir is not None,
+            "perceptual_enabled": self.perceptual,
+            "pipeline": self.pipeline,
+            "hit_ratio": round(hits / lookups, 3) if lookups else 0.0,
+        }
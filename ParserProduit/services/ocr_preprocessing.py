@@ -0,0 +1,120 @@
+import os
+from typing import Optional
+
+import numpy as np
+from PIL import Image, ImageOps
+
+# Résolution visée pour Tesseract (qualité optimale autour de 300 DPI)
+TARGET_DPI = int(os.getenv("OCR_TARGET_DPI", "300"))
+# Sans information DPI (photos), on borne le plus grand côté de l'image
+MAX_SIDE_PX = int(os.getenv("OCR_MAX_SIDE_PX", "2000"))
+DESKEW_MAX_ANGLE = float(os.getenv("OCR_DESKEW_MAX_ANGLE", "5"))
+DESKEW_STEP = 0.5
+# À incrémenter à chaque changement du prétraitement: invalide le cache OCR (mémoire et disque)
+PREPROCESS_VERSION = 1
+
+INGREDIENTS_KEYWORDS = ("ingredient", "ingrédient", "composition")
+
+
+def pipeline_signature(preprocess: bool, crop_ingredients: bool) -> str:
+    """Tout ce dont dépend le texte OCR d'une image, hors l'image elle-même"""
+    if not preprocess:
+        return f"v{PREPROCESS_VERSION}:raw"
+    return (
+        f"v{PREPROCESS_VERSION}:dpi={TARGET_DPI}:side={MAX_SIDE_PX}:"
+        f"deskew={DESKEW_MAX_ANGLE}:crop={int(crop_ingredients)}"
+    )
+
+
+def downscale(image: Image.Image, target_dpi: int = TARGET_DPI, max_side: int = MAX_SIDE_PX) -> Image.Image:
+    """Réduit l'image à la résolution utile pour l'OCR (jamais d'agrandissement)"""
+    scale = 1.0
+    dpi = image.info.get("dpi")
+    if dpi and dpi[0] and dpi[0] > target_dpi:
+        scale = target_dpi / float(dpi[0])
+    longest = max(image.size) * scale
+    if longest > max_side:
+        scale *= max_side / longest
+    if scale >= 1.0:
+        return image
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    return image.resize(size, Image.LANCZOS)
+
+
+def to_grayscale(image: Image.Image) -> Image.Image:
+    # Respecte l'orientation EXIF des photos de smartphone
+    return ImageOps.exif_transpose(image).convert("L")
+
+
+def otsu_threshold(gray: np.ndarray) -> int:
+    histogram = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    total = gray.size
+    weights = np.cumsum(histogram)
+    means = np.cumsum(histogram * np.arange(256))
+    global_mean = means[-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        between = (global_mean * weights / total - means) ** 2 / (weights * (total - weights))
+    return int(np.nanargmax(between))
+
+
+def binarize(image: Image.Image) -> Image.Image:
+    """Seuillage global d'Otsu (texte noir sur fond blanc)"""
+    gray = np.asarray(image, dtype=np.uint8)
+    threshold = otsu_threshold(gray)
+    binary = np.where(gray > threshold, 255, 0).astype(np.uint8)
+    # Texte clair sur fond sombre: on inverse pour Tesseract
+    if binary.mean() < 127:
+        binary = 255 - binary
+    return Image.fromarray(binary)
+
+
+def estimate_skew(binary: Image.Image, max_angle: float = DESKEW_MAX_ANGLE, step: float = DESKEW_STEP) -> float:
+    """
+    Angle d'inclinaison par profil de projection: les lignes de texte bien
+    horizontales donnent la variance maximale des sommes par ligne.
+    """
+    # Estimation sur une version réduite: la précision suffit et c'est bien plus rapide
+    small = binary.copy()
+    small.thumbnail((800, 800))
+    ink = 255 - np.asarray(small, dtype=np.uint8)
+    ink_image = Image.fromarray(ink)
+
+    best_angle, best_score = 0.0, -1.0
+    for angle in np.arange(-max_angle, max_angle + step / 2, step):
+        rotated = np.asarray(ink_image.rotate(float(angle), resample=Image.NEAREST, expand=False))
+        score = float(np.var(rotated.sum(axis=1)))
+        if score > best_score:
+            best_angle, best_score = float(angle), score
+    return best_angle
+
+
+def deskew(binary: Image.Image) -> Image.Image:
+    angle = estimate_skew(binary)
+    if abs(angle) < DESKEW_STEP:
+        return binary
+    rotated = binary.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+    # L'interpolation réintroduit des niveaux de gris: on re-seuille
+    return rotated.point(lambda v: 255 if v > 127 else 0)
+
+
+def crop_to_ingredients(image: Image.Image, lang: str = "fra+eng") -> Image.Image:
+    """Recadre à partir de la ligne contenant « Ingrédients » (image inchangée si absente)"""
+    import pytesseract
+
+    data = pytesseract.image_to_data(image, lang=lang, output_type=pytesseract.Output.DICT)
+    for word, top, height in zip(data["text"], data["top"], data["height"]):
+        if any(keyword in word.lower() for keyword in INGREDIENTS_KEYWORDS):
+            top = max(0, top - height)
+            return image.crop((0, top, image.width, image.height))
+    return image
+
+
+def preprocess(image: Image.Image, crop_ingredients: bool = False, lang: Optional[str] = "fra+eng") -> Image.Image:
+    """Chaîne complète: réduction, niveaux de gris, binarisation, redressement, recadrage optionnel"""
+    image = to_grayscale(image)
+    image = downscale(image)
+    image = binarize(image)
+    image = deskew(image)
+    if crop_ingredients:
+        image = crop_to_ingredients(image, lang)
+    return image
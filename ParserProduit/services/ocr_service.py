@@ -1,10 +1,18 @@
 import pytesseract
 from PIL import Image
 import io
+import os
 import base64
 from typing import Optional, Dict, Any
 import re
 
+from services.ocr_preprocessing import preprocess as preprocess_image
+
+OCR_PREPROCESS = os.getenv("OCR_PREPROCESS", "true").lower() == "true"
+# Recadrage sur la liste d'ingrédients: utile pour la composition seule,
+# mais supprime le nom et la marque en haut de l'étiquette
+OCR_CROP_INGREDIENTS = os.getenv("OCR_CROP_INGREDIENTS", "false").lower() == "true"
+
 class OCRService:
     """Service pour l'extraction de texte via OCR"""
     
@@ -13,11 +21,18 @@ class OCRService:
         # pytesseract.pytesseract.tesseract_cmd = r'Tesseract-OCR/tesseract.exe'
         pass
     
-    def extract_text_from_image(self, image_base64: str) -> Optional[str]:
+    def extract_text_from_image(
+        self,
+        image_base64: str,
+        preprocess: bool = OCR_PREPROCESS,
+        crop_ingredients: bool = OCR_CROP_INGREDIENTS,
+    ) -> Optional[str]:
         """Extrait le texte d'une image en base64"""
         try:
             image_data = base64.b64decode(image_base64)
             image = Image.open(io.BytesIO(image_data))
+            if preprocess:
+                image = preprocess_image(image, crop_ingredients=crop_ingredients)
             text = pytesseract.image_to_string(image, lang='fra+eng')
             return text
         except Exception as e:
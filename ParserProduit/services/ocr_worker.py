@@ -0,0 +1,83 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Any, Dict, Optional
+
+from services.ocr_service import OCRService, OCR_PREPROCESS, OCR_CROP_INGREDIENTS
+
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+# Nombre de demandes pouvant attendre un worker libre avant rejet (503)
+OCR_MAX_QUEUE = int(os.getenv("OCR_MAX_QUEUE", "16"))
+
+
+class OCRQueueFull(Exception):
+    pass
+
+
+def _ocr_job(image_base64: str, preprocess: bool, crop_ingredients: bool) -> Optional[str]:
+    """Exécuté dans un processus worker: décodage, prétraitement et Tesseract"""
+    return OCRService().extract_text_from_image(image_base64, preprocess, crop_ingredients)
+
+
+class OCRWorkerPool:
+    """Pool de processus OCR: le décodage et le prétraitement ne bloquent plus la boucle asyncio"""
+
+    def __init__(self, workers: int = OCR_WORKERS, max_queue: int = OCR_MAX_QUEUE):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    async def extract_text(
+        self,
+        image_base64: str,
+        preprocess: bool = OCR_PREPROCESS,
+        crop_ingredients: bool = OCR_CROP_INGREDIENTS,
+    ) -> Optional[str]:
+        if self._in_flight >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise OCRQueueFull(f"File OCR pleine ({self._in_flight} demandes en cours)")
+
+        self._in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            text = await loop.run_in_executor(
+                self._get_executor(),
+                partial(_ocr_job, image_base64, preprocess, crop_ingredients)
+            )
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self._in_flight -= 1
+        # OCRService renvoie None quand l'OCR a échoué dans le worker
+        if text is None:
+            self.failed += 1
+        else:
+            self.completed += 1
+        return text
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "in_flight": self._in_flight,
+            "queued": max(0, self._in_flight - self.workers),
+            "max_queue": self.max_queue,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,69 @@
+import os
+from typing import Any, Dict, Optional
+
+from sqlalchemy import case
+
+from database.connection import SessionLocal
+from models.database import OffProduct
+
+# Désactivé par défaut: sans dump importé (import_off_dump.py) chaque scan paierait une requête inutile
+OFF_MIRROR_ENABLED = os.getenv("OFF_MIRROR_ENABLED", "false").lower() == "true"
+
+# Champs du produit Open Food Facts utilisés par BarcodeService._normalize_data
+MIRROR_FIELDS = (
+    "code",
+    "product_name",
+    "brands",
+    "ingredients_text",
+    "quantity",
+    "net_weight_value",
+    "net_weight",
+    "packaging",
+    "packaging_tags",
+    "packaging_materials",
+)
+# Champs liste dans l'API JSON mais chaînes séparées par des virgules dans le dump CSV
+LIST_FIELDS = ("packaging_tags", "packaging_materials")
+
+
+def compact_product(raw: Dict[str, Any]) -> Dict[str, Any]:
+    """Réduit un produit du dump (JSONL ou CSV) aux champs utiles, au format de l'API"""
+    product = {}
+    for field in MIRROR_FIELDS:
+        value = raw.get(field)
+        if value in (None, ""):
+            continue
+        if field in LIST_FIELDS and isinstance(value, str):
+            value = [tag.strip() for tag in value.split(",") if tag.strip()]
+        product[field] = value
+    return product
+
+
+class OffMirror:
+    """Recherche dans le miroir local d'Open Food Facts (table off_products)"""
+
+    def lookup(self, barcode: str) -> Optional[Dict[str, Any]]:
+        """Retourne une réponse au format de l'API v0 ({"status": 1, "product": ...}) ou None"""
+        # Le dump stocke parfois les UPC-A (12 chiffres) sans le zéro initial de l'EAN-13
+        candidates = list(dict.fromkeys([barcode, barcode.lstrip("0"), barcode.zfill(13)]))
+        db = SessionLocal()
+        try:
+            row = (
+                db.query(OffProduct)
+                .filter(OffProduct.code.in_(candidates))
+                # Si plusieurs variantes existent: le code scanné tel quel, puis l'EAN-13
+                .order_by(case(
+                    (OffProduct.code == barcode, 0),
+                    (OffProduct.code == barcode.zfill(13), 1),
+                    else_=2,
+                ))
+                .first()
+            )
+            if row is None:
+                return None
+            return {"status": 1, "product": row.product}
+        except Exception as e:
+            print(f"Erreur miroir Open Food Facts: {e}")
+            return None
+        finally:
+            db.close()
@@ -0,0 +1,217 @@
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from sqlalchemy import func
+from starlette.concurrency import run_in_threadpool
+
+from database.connection import SessionLocal
+from models.database import Product
+
+CACHE_MAX_SIZE = int(os.getenv("PRODUCT_CACHE_SIZE", "10000"))
+# Au-delà de CACHE_TTL l'entrée est servie mais rafraîchie en arrière-plan,
+# au-delà de CACHE_STALE_TTL elle n'est plus servie du tout
+CACHE_TTL = float(os.getenv("PRODUCT_CACHE_TTL", str(24 * 3600)))
+CACHE_STALE_TTL = float(os.getenv("PRODUCT_CACHE_STALE_TTL", str(7 * 24 * 3600)))
+CACHE_NEGATIVE_TTL = float(os.getenv("PRODUCT_CACHE_NEGATIVE_TTL", "3600"))
+
+# Marqueur d'un code-barres inconnu de toutes les sources
+NOT_FOUND = object()
+
+
+class LRUCache:
+    """Cache mémoire borné en taille; chaque entrée porte son horodatage"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key: str, value: Any, stored_at: Optional[float] = None):
+        self._entries[key] = (value, time.time() if stored_at is None else stored_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        self._entries.pop(key, None)
+
+    def values(self):
+        return list(self._entries.values())
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class ProductCache:
+    """
+    Cache produit à deux niveaux: LRU en mémoire devant la table `products`.
+    - cache négatif (mémoire uniquement) pour les codes-barres introuvables
+    - stale-while-revalidate: une entrée périmée est servie pendant qu'un
+      rafraîchissement est lancé en arrière-plan
+    """
+
+    def __init__(
+        self,
+        normalize: Callable[[Dict[str, Any]], Dict[str, Any]],
+        max_size: int = CACHE_MAX_SIZE,
+        ttl: float = CACHE_TTL,
+        stale_ttl: float = CACHE_STALE_TTL,
+        negative_ttl: float = CACHE_NEGATIVE_TTL,
+    ):
+        self.normalize = normalize
+        self.memory = LRUCache(max_size)
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = negative_ttl
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self.counters = {
+            "memory_hits": 0,
+            "database_hits": 0,
+            "negative_hits": 0,
+            "stale_served": 0,
+            "misses": 0,
+            "refreshes": 0,
+            "refresh_errors": 0,
+            "lookup_errors": 0,
+        }
+
+    async def get_or_load(
+        self, gtin: str, loader: Callable[[], Awaitable[Optional[Dict[str, Any]]]]
+    ) -> Tuple[Optional[Dict[str, Any]], str]:
+        """
+        Retourne (product_data, tier) avec tier = "memory", "database" ou "network".
+        product_data vaut None si le code-barres est inconnu.
+        Seul un None du loader (toutes les sources ont répondu « inconnu ») est mis
+        en cache négatif; une exception du loader (erreur, délai) est propagée sans
+        rien mettre en cache.
+        """
+        # 1. Niveau mémoire
+        entry = self.memory.get(gtin)
+        if entry is not None:
+            value, stored_at = entry
+            age = time.time() - stored_at
+            if value is NOT_FOUND:
+                if age < self.negative_ttl:
+                    self.counters["negative_hits"] += 1
+                    return None, "memory"
+                self.memory.delete(gtin)
+            elif age < self.stale_ttl:
+                self.counters["memory_hits"] += 1
+                if age >= self.ttl:
+                    self._serve_stale(gtin, loader)
+                return value, "memory"
+            else:
+                self.memory.delete(gtin)
+
+        # 2. Niveau base de données
+        row = await run_in_threadpool(self._load_from_db, gtin)
+        if row is not None:
+            value, stored_at = row
+            age = time.time() - stored_at
+            if age < self.stale_ttl:
+                self.counters["database_hits"] += 1
+                self.memory.set(gtin, value, stored_at)
+                if age >= self.ttl:
+                    self._serve_stale(gtin, loader)
+                return value, "database"
+
+        # 3. Réseau
+        self.counters["misses"] += 1
+        try:
+            value = await loader()
+        except Exception:
+            self.counters["lookup_errors"] += 1
+            raise
+        await self.store(gtin, value)
+        return value, "network"
+
+    async def store(self, gtin: str, product_data: Optional[Dict[str, Any]]):
+        if not product_data:
+            self.memory.set(gtin, NOT_FOUND)
+            return
+        self.memory.set(gtin, product_data)
+        await run_in_threadpool(self._save_to_db, gtin, product_data)
+
+    def _serve_stale(self, gtin: str, loader):
+        self.counters["stale_served"] += 1
+        if gtin in self._refreshing:
+            return
+        task = asyncio.create_task(self._refresh(gtin, loader))
+        self._refreshing[gtin] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(gtin, None))
+
+    async def _refresh(self, gtin: str, loader):
+        try:
+            value = await loader()
+            # Une source momentanément indisponible ne doit pas effacer une entrée valide
+            if value:
+                await self.store(gtin, value)
+            self.counters["refreshes"] += 1
+        except Exception as e:
+            self.counters["refresh_errors"] += 1
+            print(f"Erreur rafraîchissement cache {gtin}: {e}")
+
+    def _load_from_db(self, gtin: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        db = SessionLocal()
+        try:
+            product = db.query(Product).filter(Product.gtin == gtin).first()
+            if product is None or not product.raw_data:
+                return None
+            stored_at = product.updated_at or product.created_at or datetime.now(timezone.utc)
+            return product.raw_data, stored_at.timestamp()
+        except Exception as e:
+            # Base indisponible: on retombe sur les sources externes
+            print(f"Erreur lecture cache {gtin}: {e}")
+            return None
+        finally:
+            db.close()
+
+    def _save_to_db(self, gtin: str, product_data: Dict[str, Any]):
+        if len(gtin) > Product.gtin.type.length:
+            return
+        normalized = self.normalize(product_data)
+        packaging = normalized.get("packaging")
+        db = SessionLocal()
+        try:
+            product = db.query(Product).filter(Product.gtin == gtin).first()
+            if product is None:
+                product = Product(gtin=gtin)
+                db.add(product)
+            product.name = (normalized.get("name") or "")[:255] or None
+            product.brand = (normalized.get("brand") or "")[:100] or None
+            composition = normalized.get("composition")
+            product.composition = str(composition) if composition else None
+            product.packaging = json.dumps(packaging, ensure_ascii=False) if packaging else None
+            product.raw_data = product_data
+            product.normalized_data = normalized
+            # Horodatage explicite: des données identiques ne déclenchent aucun UPDATE,
+            # donc onupdate ne ferait jamais avancer la fraîcheur de l'entrée
+            product.updated_at = func.now()
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"Erreur sauvegarde cache {gtin}: {e}")
+        finally:
+            db.close()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = (
+            self.counters["memory_hits"] + self.counters["database_hits"]
+            + self.counters["negative_hits"] + self.counters["misses"]
+        )
+        hits = lookups - self.counters["misses"]
+        return {
+            **self.counters,
+            "memory_size": len(self.memory),
+            "hit_ratio": round(hits / lookups, 3) if lookups else 0.0,
+        }
@@ -1,15 +1,18 @@
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 from typing import List, Dict
 import requests
 import socket
-from sqlalchemy.orm import Session
-from database.connection import get_db, Base, engine
+from database.connection import Base, engine
 from database.models import ScoreHistory
+from ecolabel_common.write_behind import WriteBehindQueue, WriteQueueFull
 
 # Create tables if not exist
 Base.metadata.create_all(bind=engine)
 
+# Score history is archived in the background, in bulk
+history_writer = WriteBehindQueue(engine, ScoreHistory)
+
 # ---------- Pydantic Models ----------
 class TotalImpacts(BaseModel):
     co2_g: float
@@ -120,12 +123,15 @@ def build_explanations(impacts: TotalImpacts, co2_score: float, water_score: flo
 CONSUL_URL = "http://consul:8500/v1/agent/service/register"
 
 def register_service(name: str, service_name: str, port: int):
+    address = socket.gethostbyname(socket.gethostname())
+    # One ID per replica so scaled-out instances do not overwrite each other
     payload = {
+        "ID": f"{service_name}-{socket.gethostname()}",
         "Name": name,
-        "Address": socket.gethostbyname(socket.gethostname()),
+        "Address": address,
         "Port": port,
         "Check": {
-            "HTTP": f"http://{service_name}:{port}/health",
+            "HTTP": f"http://{address}:{port}/health",
             "Interval": "10s"
         }
     }
@@ -137,9 +143,17 @@ app = FastAPI(title="EcoLabel-MS4 – Service de Scoring")
 def startup():
     register_service("SCORING", "scoring", 8004)
 
+@app.on_event("shutdown")
+def shutdown():
+    history_writer.stop()
+
+@app.get("/debug/write-behind")
+def debug_write_behind():
+    return history_writer.stats()
+
 
 @app.post("/score/compute", response_model=EcoScoreResponse)
-def compute_score(ms3_data: MS3Output, db: Session = Depends(get_db)):
+def compute_score(ms3_data: MS3Output):
 
     impacts = ms3_data.total_impacts
 
@@ -165,31 +179,32 @@ def compute_score(ms3_data: MS3Output, db: Session = Depends(get_db)):
         energy_score=energy_score
     )
 
-    score_record = ScoreHistory(
-        product_name=ms3_data.product_name,
-        eco_score_numeric=eco_numeric,
-        eco_score_letter=eco_letter,
-        confidence=confidence,
-        impacts_scores={
-            "co2_score": co2_score,
-            "water_score": water_score,
-            "energy_score": energy_score
-        },
-        total_impacts=impacts.dict(),
-        explanations=explanations
-    )
+    impacts_scores = {
+        "co2_score": co2_score,
+        "water_score": water_score,
+        "energy_score": energy_score
+    }
 
-    db.add(score_record)
-    db.commit()
-    db.refresh(score_record)
+    try:
+        score_id = history_writer.submit({
+            "product_name": ms3_data.product_name,
+            "eco_score_numeric": eco_numeric,
+            "eco_score_letter": eco_letter,
+            "confidence": confidence,
+            "impacts_scores": impacts_scores,
+            "total_impacts": impacts.dict(),
+            "explanations": explanations
+        })
+    except WriteQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
 
     return EcoScoreResponse(
-        score_id=score_record.id,
+        score_id=score_id,
         product_name=ms3_data.product_name,
         eco_score_numeric=eco_numeric,
         eco_score_letter=eco_letter,
         confidence=confidence,
-        impacts_scores=score_record.impacts_scores,
+        impacts_scores=impacts_scores,
         total_impacts=impacts,
         explanations=explanations
     )
@@ -0,0 +1,7 @@
+"""
+Code shared by the EcoLabel-MS services.
+
+Installed by each service from its requirements.txt ("../common", resolved
+from the service directory; the Dockerfiles copy this directory to /common
+from the "common" build context of docker-compose.yml).
+"""
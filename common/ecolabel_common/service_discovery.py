@@ -0,0 +1,231 @@
+"""
+Cached service discovery backed by Consul.
+
+Healthy instances of each service are kept in an in-process cache that a
+background thread refreshes with Consul blocking queries, so a lookup is a
+dictionary read instead of a Consul round trip. A balancing strategy picks
+one instance among the passing ones.
+
+Used by the Gateway and NLPIngredients.
+"""
+import itertools
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import requests
+
+CONSUL_BASE_URL = os.getenv("CONSUL_BASE_URL", "http://consul:8500")
+CACHE_TTL = float(os.getenv("DISCOVERY_CACHE_TTL", "30"))
+WATCH_WAIT = os.getenv("DISCOVERY_WATCH_WAIT", "30s")
+BALANCER = os.getenv("DISCOVERY_BALANCER", "round_robin")
+REQUEST_TIMEOUT = 3
+WATCH_RETRY_DELAY = 2
+# Longest a blocking query can take: the wait, up to wait/16 of Consul jitter, and the request timeout
+WATCH_MAX_SECONDS = int(WATCH_WAIT.rstrip("s")) * 17 / 16 + REQUEST_TIMEOUT
+
+
+class ServiceInstance:
+    __slots__ = ("id", "address", "port", "outstanding")
+
+    def __init__(self, id: str, address: str, port: int):
+        self.id = id
+        self.address = address
+        self.port = port
+        self.outstanding = 0
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.address}:{self.port}"
+
+    def __repr__(self):
+        return f"ServiceInstance({self.id!r}, {self.url!r}, outstanding={self.outstanding})"
+
+
+# -------- Balancing strategies -------- #
+
+class RoundRobinBalancer:
+    def __init__(self):
+        self._counter = itertools.count()
+
+    def pick(self, instances: List[ServiceInstance]) -> ServiceInstance:
+        return instances[next(self._counter) % len(instances)]
+
+
+class LeastOutstandingBalancer:
+    def pick(self, instances: List[ServiceInstance]) -> ServiceInstance:
+        # Random tie-break so idle instances share the load
+        return min(instances, key=lambda inst: (inst.outstanding, random.random()))
+
+
+class PowerOfTwoChoicesBalancer:
+    def pick(self, instances: List[ServiceInstance]) -> ServiceInstance:
+        if len(instances) == 1:
+            return instances[0]
+        first, second = random.sample(instances, 2)
+        return first if first.outstanding <= second.outstanding else second
+
+
+BALANCERS = {
+    "round_robin": RoundRobinBalancer,
+    "least_outstanding": LeastOutstandingBalancer,
+    "p2c": PowerOfTwoChoicesBalancer,
+}
+
+
+class _CacheEntry:
+    __slots__ = ("instances", "index", "fetched_at")
+
+    def __init__(self, instances: List[ServiceInstance], index: int, fetched_at: float):
+        self.instances = instances
+        self.index = index
+        self.fetched_at = fetched_at
+
+
+# -------- Registry -------- #
+
+class ServiceRegistry:
+    def __init__(self, consul_url: str = CONSUL_BASE_URL, ttl: float = CACHE_TTL, balancer: str = BALANCER):
+        if balancer not in BALANCERS:
+            raise ValueError(f"Unknown balancer '{balancer}', expected one of {sorted(BALANCERS)}")
+        self.consul_url = consul_url.rstrip("/")
+        self.ttl = ttl
+        self._balancer_cls = BALANCERS[balancer]
+        self._balancers: Dict[str, object] = {}
+        self._entries: Dict[str, _CacheEntry] = {}
+        self._watchers: Dict[str, threading.Thread] = {}
+        self._lock = threading.Lock()
+        self._session = requests.Session()
+
+    def _fetch(self, service_name: str, index: int = 0, wait: Optional[str] = None):
+        """Returns (instances, consul_index) for the passing instances of a service"""
+        params = {"passing": "true"}
+        timeout = REQUEST_TIMEOUT
+        if index:
+            params["index"] = index
+            params["wait"] = wait
+            # Blocking queries may legitimately hang for the whole wait period
+            timeout = REQUEST_TIMEOUT + int(wait.rstrip("s"))
+
+        response = self._session.get(
+            f"{self.consul_url}/v1/health/service/{service_name}",
+            params=params,
+            timeout=timeout,
+        )
+        response.raise_for_status()
+        new_index = int(response.headers.get("X-Consul-Index", 0))
+
+        instances = []
+        for entry in response.json():
+            service = entry["Service"]
+            address = service.get("Address") or entry["Node"]["Address"]
+            instances.append(ServiceInstance(service["ID"], address, service["Port"]))
+        return instances, new_index
+
+    def _store(self, service_name: str, instances: List[ServiceInstance], index: int):
+        with self._lock:
+            previous = self._entries.get(service_name)
+            if previous:
+                # Instances still registered keep their object, so release() of a
+                # request acquired before the refresh decrements the live counter
+                current = {inst.id: inst for inst in previous.instances}
+                merged = []
+                for inst in instances:
+                    existing = current.get(inst.id)
+                    if existing is None:
+                        merged.append(inst)
+                        continue
+                    existing.address, existing.port = inst.address, inst.port
+                    merged.append(existing)
+                instances = merged
+            self._entries[service_name] = _CacheEntry(instances, index, time.monotonic())
+
+    def _watch(self, service_name: str):
+        index = self._entries[service_name].index
+        while True:
+            try:
+                instances, new_index = self._fetch(service_name, index or 1, WATCH_WAIT)
+                # Consul indexes can go backwards (e.g. after a restart): start over
+                if new_index < index:
+                    new_index = 0
+                self._store(service_name, instances, new_index)
+                index = new_index
+            except Exception as e:
+                print(f"Consul watch error for {service_name}: {e}")
+                time.sleep(WATCH_RETRY_DELAY)
+
+    def _ensure_watcher(self, service_name: str):
+        with self._lock:
+            watcher = self._watchers.get(service_name)
+            if watcher is None or not watcher.is_alive():
+                watcher = threading.Thread(target=self._watch, args=(service_name,), daemon=True)
+                self._watchers[service_name] = watcher
+                watcher.start()
+
+    def seed(self, service_name: str, instances: List[ServiceInstance]):
+        """Registers a static instance list (no Consul lookup until the TTL expires)"""
+        self._store(service_name, instances, 0)
+
+    def is_fresh(self, service_name: str) -> bool:
+        entry = self._entries.get(service_name)
+        if entry is None:
+            return False
+        max_age = self.ttl
+        watcher = self._watchers.get(service_name)
+        if watcher is not None and watcher.is_alive():
+            # Without changes the watcher only refreshes the entry when its blocking
+            # query times out; the entry expires only if that query is overdue
+            max_age += WATCH_MAX_SECONDS
+        return time.monotonic() - entry.fetched_at < max_age
+
+    def instances(self, service_name: str) -> List[ServiceInstance]:
+        """Returns the cached passing instances, fetching from Consul on a cold or expired cache"""
+        if not self.is_fresh(service_name):
+            try:
+                instances, index = self._fetch(service_name)
+                self._store(service_name, instances, index)
+                self._ensure_watcher(service_name)
+            except Exception as e:
+                # Serve stale instances rather than failing while Consul is unreachable
+                if service_name not in self._entries:
+                    raise RuntimeError(f"Service {service_name} not found in Consul: {e}")
+                print(f"Consul lookup failed for {service_name}, using stale cache: {e}")
+        return self._entries[service_name].instances
+
+    def pick(self, service_name: str) -> ServiceInstance:
+        instances = self.instances(service_name)
+        if not instances:
+            raise RuntimeError(f"No healthy instance of {service_name} in Consul")
+        balancer = self._balancers.get(service_name)
+        if balancer is None:
+            balancer = self._balancers.setdefault(service_name, self._balancer_cls())
+        return balancer.pick(instances)
+
+    def acquire(self, service_name: str) -> ServiceInstance:
+        """Picks an instance and counts a request in flight until release()"""
+        instance = self.pick(service_name)
+        with self._lock:
+            instance.outstanding += 1
+        return instance
+
+    def release(self, instance: ServiceInstance):
+        with self._lock:
+            instance.outstanding -= 1
+
+    @contextmanager
+    def use(self, service_name: str):
+        instance = self.acquire(service_name)
+        try:
+            yield instance
+        finally:
+            self.release(instance)
+
+
+registry = ServiceRegistry()
+
+
+def discover(service_name: str) -> str:
+    return registry.pick(service_name).url
@@ -0,0 +1,192 @@
+"""
+Write-behind persistence for history tables.
+
+Records are queued in memory and written by a background thread in bulk
+(multi-row INSERT) once WRITE_BEHIND_BATCH_SIZE records are pending or
+WRITE_BEHIND_FLUSH_MS has elapsed. Primary keys are allocated up front from
+the table's sequence in blocks, so the request path can return the ID
+without waiting for the insert.
+
+Used by NLPIngredients, LCALite and Scoring.
+"""
+import os
+import queue
+import threading
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import insert, text
+
+BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "200"))
+FLUSH_MS = float(os.getenv("WRITE_BEHIND_FLUSH_MS", "200"))
+MAX_QUEUE = int(os.getenv("WRITE_BEHIND_MAX_QUEUE", "10000"))
+# How long a request waits for room in a full queue before failing
+PUT_TIMEOUT = float(os.getenv("WRITE_BEHIND_PUT_TIMEOUT", "1"))
+ID_BLOCK_SIZE = int(os.getenv("WRITE_BEHIND_ID_BLOCK", "100"))
+MAX_RETRIES = 3
+
+
+class WriteQueueFull(Exception):
+    pass
+
+
+class IdAllocator:
+    """Hands out primary keys from blocks reserved in one round trip (hi/lo)"""
+
+    def __init__(self, engine, table: str, block_size: int = ID_BLOCK_SIZE):
+        self.engine = engine
+        self.table = table
+        self.block_size = block_size
+        self._ids: List[int] = []
+        self._next_local = None
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> List[int]:
+        with self.engine.begin() as conn:
+            if self.engine.dialect.name == "postgresql":
+                return list(conn.execute(
+                    text("SELECT nextval(pg_get_serial_sequence(:table, 'id')) FROM generate_series(1, :n)"),
+                    {"table": self.table, "n": self.block_size}
+                ).scalars())
+            # No sequences (SQLite, local runs): continue from the current maximum in this process
+            if self._next_local is None:
+                self._next_local = conn.execute(text(f"SELECT COALESCE(MAX(id), 0) FROM {self.table}")).scalar() + 1
+            start, self._next_local = self._next_local, self._next_local + self.block_size
+            return list(range(start, start + self.block_size))
+
+    def next_id(self) -> int:
+        with self._lock:
+            if not self._ids:
+                self._ids = self._reserve()
+                self._ids.reverse()
+            return self._ids.pop()
+
+
+class WriteBehindQueue:
+    def __init__(
+        self,
+        engine,
+        model,
+        batch_size: int = BATCH_SIZE,
+        flush_ms: float = FLUSH_MS,
+        max_queue: int = MAX_QUEUE,
+        put_timeout: float = PUT_TIMEOUT,
+    ):
+        self.engine = engine
+        self.model = model
+        self.ids = IdAllocator(engine, model.__tablename__)
+        self.batch_size = batch_size
+        self.flush_interval = flush_ms / 1000
+        self.put_timeout = put_timeout
+        self.max_queue = max_queue
+        # Unbounded queue: capacity is reserved for a whole submit_many() call
+        # up front (_pending), so a batch is queued entirely or not at all
+        self._queue: "queue.Queue" = queue.Queue()
+        self._pending = 0
+        self._capacity = threading.Condition()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self.counters = {"submitted": 0, "written": 0, "batches": 0, "retries": 0, "dropped": 0, "rejected": 0}
+        self.last_flush_ms = 0.0
+
+    def _ensure_started(self):
+        # Started on first use, once per process: threads do not survive a fork
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._pending = 0
+                self._capacity = threading.Condition()
+                self.ids = IdAllocator(self.engine, self.model.__tablename__)
+                self._thread = threading.Thread(
+                    target=self._run, name=f"write-behind-{self.model.__tablename__}", daemon=True
+                )
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def submit(self, record: Dict) -> int:
+        """Queue one row and return its primary key; raises WriteQueueFull under sustained overload"""
+        return self.submit_many([record])[0]
+
+    def submit_many(self, records: List[Dict]) -> List[int]:
+        """Queue all rows or none: WriteQueueFull means nothing was queued, so a retry cannot duplicate rows"""
+        self._ensure_started()
+        if len(records) > self.max_queue:
+            self.counters["rejected"] += 1
+            raise WriteQueueFull(f"{len(records)} rows exceed the write queue size ({self.max_queue})")
+        # Ids first: a failure to reserve them leaves nothing queued
+        records = [{**record, "id": self.ids.next_id()} for record in records]
+        # Backpressure: a full queue slows requests down before rejecting them
+        with self._capacity:
+            if not self._capacity.wait_for(
+                lambda: self._pending + len(records) <= self.max_queue, timeout=self.put_timeout
+            ):
+                self.counters["rejected"] += 1
+                raise WriteQueueFull(f"Write queue full ({self._pending} of {self.max_queue} pending rows)")
+            self._pending += len(records)
+        for record in records:
+            self._queue.put(record)
+        self.counters["submitted"] += len(records)
+        return [record["id"] for record in records]
+
+    def _release(self, n: int):
+        with self._capacity:
+            self._pending -= n
+            self._capacity.notify_all()
+
+    def _collect(self) -> List[Dict]:
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not (self._stopped.is_set() and self._queue.empty()):
+            batch = self._collect()
+            if batch:
+                self._release(len(batch))
+                self._write(batch)
+
+    def _write(self, batch: List[Dict]):
+        for attempt in range(MAX_RETRIES + 1):
+            start = time.perf_counter()
+            try:
+                with self.engine.begin() as conn:
+                    conn.execute(insert(self.model), batch)
+                self.counters["written"] += len(batch)
+                self.counters["batches"] += 1
+                self.last_flush_ms = (time.perf_counter() - start) * 1000
+                return
+            except Exception as e:
+                if attempt == MAX_RETRIES:
+                    self.counters["dropped"] += len(batch)
+                    print(f"❌ Dropping {len(batch)} {self.model.__tablename__} rows: {e}")
+                    return
+                self.counters["retries"] += 1
+                time.sleep(0.1 * 2 ** attempt)
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "queue_depth": self._pending,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+        }
+
+    def stop(self, timeout: float = 30):
+        """Flush everything still queued, then stop the writer thread"""
+        self._stopped.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout)